@@ -1,5 +1,10 @@
 import django_filters
-from recipes.models import Recipe, Tag
+from recipes.models import Recipe
+from recipes.postings import (MATCH_MODES, MAX_QUERY_INGREDIENTS,
+                              match_ingredients)
+from recipes.search import (RankedRecipes, ingredient_index, rank_recipes,
+                            search_recipes)
+from recipes.tags import filter_by_tags, tag_ids
 from rest_framework.exceptions import NotAcceptable, NotAuthenticated
 from rest_framework.filters import SearchFilter
 
@@ -7,16 +12,44 @@ from rest_framework.filters import SearchFilter
 class IngredientFilter(SearchFilter):
     search_param = 'name'
 
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param, '')
+        name = name.replace('\x00', '').strip()
+        if not name or view.action != 'list':
+            return super().filter_queryset(request, queryset, view)
+        return list(
+            ingredient_index.search(name)
+            or ingredient_index.fuzzy_search(name)
+        )
+
 
 class RecipeFilter(django_filters.FilterSet):
     author = django_filters.NumberFilter(field_name='author__id')
-    tags = django_filters.ModelMultipleChoiceFilter(
-        to_field_name='slug',
-        lookup_expr='slug',
-        queryset=Tag.objects.all()
-    )
+    tags = django_filters.Filter(method='filter_tags')
     is_favorited = django_filters.Filter(method='filter_favorited')
     is_in_shopping_cart = django_filters.Filter(method='filter_cart')
+    search = django_filters.CharFilter(method='filter_search')
+    ingredients = django_filters.CharFilter(method='filter_ingredients')
+
+    def filter_queryset(self, queryset):
+        """Фильтры с рангом из индекса в памяти дают RankedRecipes, а
+        django-filter ждёт от каждого фильтра QuerySet. Поэтому их порядок
+        запоминается и применяется после остальных фильтров."""
+        self.ranked = None
+        queryset = super().filter_queryset(queryset)
+        if self.ranked is None:
+            return queryset
+        return rank_recipes(queryset, self.ranked)
+
+    def keep_rank(self, queryset, result):
+        if not isinstance(result, RankedRecipes):
+            return result
+        ids = result.ids
+        if self.ranked is not None:
+            known = set(self.ranked)
+            ids = [pk for pk in ids if pk in known]
+        self.ranked = ids
+        return queryset
 
     def filter_cart(self, queryset, name, query_value):
         user = self.request.user
@@ -40,6 +73,43 @@ class RecipeFilter(django_filters.FilterSet):
         else:
             raise NotAcceptable(f'{name} принимает значения 0 или 1')
 
+    def filter_tags(self, queryset, name, query_value):
+        slugs = [slug for slug in self.data.getlist(name) if slug]
+        ids, unknown = tag_ids.ids(slugs)
+        if unknown:
+            raise NotAcceptable(
+                f'{name}: неизвестные теги {", ".join(unknown)}'
+            )
+        return filter_by_tags(queryset, ids)
+
+    def filter_search(self, queryset, name, query_value):
+        query_value = query_value.replace('\x00', '').strip()
+        if not query_value:
+            return queryset
+        return self.keep_rank(
+            queryset, search_recipes(queryset, query_value)
+        )
+
+    def filter_ingredients(self, queryset, name, query_value):
+        try:
+            ids = {int(pk) for pk in query_value.split(',') if pk.strip()}
+        except ValueError:
+            raise NotAcceptable(f'{name} принимает id через запятую')
+        if len(ids) > MAX_QUERY_INGREDIENTS:
+            raise NotAcceptable(
+                f'{name}: не больше {MAX_QUERY_INGREDIENTS} ингредиентов'
+            )
+        match = self.data.get('match') or 'all'
+        if match not in MATCH_MODES:
+            raise NotAcceptable(
+                f'match принимает значения {", ".join(MATCH_MODES)}'
+            )
+        if not ids:
+            return queryset
+        return self.keep_rank(
+            queryset, match_ingredients(queryset, ids, match)
+        )
+
     class Meta:
         model = Recipe
         fields = ('author', 'tags')
@@ -0,0 +1,370 @@
+"""Метрики производительности API в формате Prometheus.
+
+Middleware замеряет для каждого DRF-представления и действия время ответа,
+число и время запросов к базе и размер ответа. У потоковых ответов замер
+заканчивается, когда тело отдано целиком. Каждый процесс gunicorn
+копит значения у себя и периодически сбрасывает снимок в METRICS_DIR,
+эндпоинт /api/_metrics складывает снимки всех процессов.
+
+Снимок называется по pid и времени старта процесса, поэтому новый
+процесс с тем же pid не перезаписывает чужие значения. Снимки
+завершившихся процессов прибавляются к archive.json и удаляются, так что
+каталог не растёт, а счётчики не уменьшаются.
+"""
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+METRICS_DIR = getattr(
+    settings, 'METRICS_DIR',
+    os.path.join(tempfile.gettempdir(), 'foodgram_metrics')
+)
+METRICS_TOKEN = getattr(settings, 'METRICS_TOKEN', None)
+FLUSH_INTERVAL = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+
+SECONDS_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216
+)
+HISTOGRAMS = {
+    'foodgram_request_duration_seconds': (
+        'Время обработки запроса', SECONDS_BUCKETS
+    ),
+    'foodgram_db_queries': (
+        'Число запросов к базе за запрос', QUERIES_BUCKETS
+    ),
+    'foodgram_db_duration_seconds': (
+        'Время запросов к базе за запрос', SECONDS_BUCKETS
+    ),
+    'foodgram_response_size_bytes': (
+        'Размер тела ответа', BYTES_BUCKETS
+    ),
+}
+COUNTERS = {
+    'foodgram_requests_total': 'Число запросов по статусу ответа',
+    'foodgram_conditional_get_total': 'Условные GET по результату',
+    'foodgram_conditional_get_bytes_total': 'Байт отдано полными ответами',
+}
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {name: {} for name in HISTOGRAMS}
+        self.counters = {name: {} for name in COUNTERS}
+        self.last_flush = 0.0
+        self.pid = None
+        self.started = None
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = json.dumps(labels, sort_keys=True)
+        with self.lock:
+            series = self.histograms[name].setdefault(key, {
+                'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0
+            })
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def inc(self, name, labels, value=1):
+        key = json.dumps(labels, sort_keys=True)
+        with self.lock:
+            counter = self.counters[name]
+            counter[key] = counter.get(key, 0) + value
+
+    def snapshot(self):
+        with self.lock:
+            return json.dumps({
+                'histograms': self.histograms, 'counters': self.counters
+            })
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_flush < FLUSH_INTERVAL:
+            return
+        self.last_flush = now
+        pid = os.getpid()
+        if pid != self.pid:
+            self.pid, self.started = pid, time.time_ns()
+        write_file(
+            os.path.join(METRICS_DIR, f'{pid}-{self.started}.json'),
+            self.snapshot()
+        )
+
+
+registry = Registry()
+
+
+def write_file(path, content):
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as file:
+        file.write(content)
+    os.replace(temporary, path)
+
+
+def read_snapshot(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def list_snapshots():
+    """Снимки процессов: имя файла, pid и время старта."""
+    try:
+        names = os.listdir(METRICS_DIR)
+    except FileNotFoundError:
+        return []
+    snapshots = []
+    for name in names:
+        pid, _, started = name.removesuffix('.json').partition('-')
+        if name.endswith('.json') and pid.isdigit() and started.isdigit():
+            snapshots.append((name, int(pid), int(started)))
+    return snapshots
+
+
+def find_finished(snapshots):
+    """Снимки завершившихся процессов, в том числе с pid, который уже
+    занял более новый процесс."""
+    latest = {}
+    for _, pid, started in snapshots:
+        latest[pid] = max(started, latest.get(pid, started))
+    return [
+        name for name, pid, started in snapshots
+        if started < latest[pid] or not is_alive(pid)
+    ]
+
+
+def empty_totals():
+    return {
+        'histograms': {name: {} for name in HISTOGRAMS},
+        'counters': {name: {} for name in COUNTERS},
+    }
+
+
+def add_histograms(totals, histograms):
+    for metric, series in histograms.items():
+        merged = totals.setdefault(metric, {})
+        for key, values in series.items():
+            target = merged.setdefault(key, {
+                'buckets': [0] * len(values['buckets']),
+                'sum': 0.0,
+                'count': 0
+            })
+            target['buckets'] = [
+                a + b for a, b in zip(target['buckets'], values['buckets'])
+            ]
+            target['sum'] += values['sum']
+            target['count'] += values['count']
+
+
+def add_counters(totals, counters):
+    for metric, series in counters.items():
+        merged = totals.setdefault(metric, {})
+        for key, value in series.items():
+            merged[key] = merged.get(key, 0) + value
+
+
+def add_snapshot(totals, snapshot):
+    add_histograms(totals['histograms'], snapshot['histograms'])
+    add_counters(totals['counters'], snapshot['counters'])
+
+
+def archive_finished(finished):
+    """Прибавляет снимки завершившихся процессов к archive.json."""
+    archive_path = os.path.join(METRICS_DIR, 'archive.json')
+    archive = read_snapshot(archive_path) or empty_totals()
+    archived = []
+    for name in finished:
+        snapshot = read_snapshot(os.path.join(METRICS_DIR, name))
+        if snapshot is not None:
+            add_snapshot(archive, snapshot)
+            archived.append(name)
+    write_file(archive_path, json.dumps(archive))
+    for name in archived:
+        os.remove(os.path.join(METRICS_DIR, name))
+
+
+def merge_snapshots():
+    totals = empty_totals()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    # Под блокировкой снимок не может попасть в сумму дважды: и в архив,
+    # и отдельным файлом.
+    with open(os.path.join(METRICS_DIR, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        snapshots = list_snapshots()
+        finished = find_finished(snapshots)
+        if finished:
+            archive_finished(finished)
+        archive = read_snapshot(os.path.join(METRICS_DIR, 'archive.json'))
+        if archive is not None:
+            add_snapshot(totals, archive)
+        for name, _, _ in snapshots:
+            if name in finished:
+                continue
+            snapshot = read_snapshot(os.path.join(METRICS_DIR, name))
+            if snapshot is not None:
+                add_snapshot(totals, snapshot)
+    return totals['histograms'], totals['counters']
+
+
+def format_labels(key, extra=None):
+    labels = json.loads(key)
+    if extra:
+        labels.update(extra)
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name, str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for name, value in labels.items()
+    )
+    return f'{{{pairs}}}'
+
+
+def render():
+    histograms, counters = merge_snapshots()
+    lines = []
+    for name, (description, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} histogram')
+        for key, series in sorted(histograms.get(name, {}).items()):
+            for bound, count in zip(buckets, series['buckets']):
+                labels = format_labels(key, {'le': bound})
+                lines.append(f'{name}_bucket{labels} {count}')
+            labels = format_labels(key, {'le': '+Inf'})
+            lines.append(f'{name}_bucket{labels} {series["count"]}')
+            lines.append(f'{name}_sum{format_labels(key)} {series["sum"]}')
+            lines.append(
+                f'{name}_count{format_labels(key)} {series["count"]}'
+            )
+    for name, description in COUNTERS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} counter')
+        for key, value in sorted(counters.get(name, {}).items()):
+            lines.append(f'{name}{format_labels(key)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def get_view_name(request):
+    match = request.resolver_match
+    if match is None:
+        return 'unresolved'
+    view = match.func
+    cls = getattr(view, 'cls', None)
+    if cls is None:
+        return match.view_name or view.__name__
+    actions = getattr(view, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{cls.__name__}.{action}'
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+@contextmanager
+def timed_queries(timer):
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        yield
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with timed_queries(timer):
+            response = self.get_response(request)
+        labels = {'view': get_view_name(request)}
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, labels, response.status_code,
+                start, timer
+            )
+        else:
+            self.record(
+                labels, response.status_code, start, timer,
+                len(response.content)
+            )
+        return response
+
+    def stream(self, content, labels, status, start, timer):
+        """Отдаёт тело ответа, считая запросы к базе и байты по ходу."""
+        size = 0
+        try:
+            with timed_queries(timer):
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self.record(labels, status, start, timer, size)
+
+    def record(self, labels, status, start, timer, size):
+        registry.observe(
+            'foodgram_request_duration_seconds', labels,
+            time.perf_counter() - start
+        )
+        registry.observe('foodgram_db_queries', labels, timer.count)
+        registry.observe(
+            'foodgram_db_duration_seconds', labels, timer.duration
+        )
+        registry.observe('foodgram_response_size_bytes', labels, size)
+        registry.inc('foodgram_requests_total', {**labels, 'status': status})
+        registry.flush()
+
+
+def metrics_view(request):
+    authorization = request.headers.get('Authorization', '')
+    allowed = (
+        METRICS_TOKEN and authorization == f'Bearer {METRICS_TOKEN}'
+    ) or (
+        request.user.is_authenticated and request.user.is_staff
+    )
+    if not allowed:
+        return HttpResponseForbidden()
+    registry.flush(force=True)
+    return HttpResponse(
+        render(), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
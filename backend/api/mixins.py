@@ -0,0 +1,161 @@
+import hashlib
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from recipes.cache import get_catalog_version
+from rest_framework import status
+from rest_framework.response import Response
+
+from .metrics import registry
+from .replicas import primary_reads
+
+
+class CatalogCacheMixin:
+    """Кеширует готовые ответы справочников в байтах.
+
+    Ключ включает версию справочников, которую сигналы сохранения и
+    удаления Tag/Ingredient меняют, поэтому устаревшие записи просто
+    перестают читаться. Кешируются только успешные JSON-ответы. Версия
+    читается из основной базы, поэтому и ответ при промахе кеша строится
+    по ней: отстающая реплика положила бы старые данные под новую версию.
+    """
+    cache_prefix = 'catalog'
+    cache_timeout = None
+
+    def get_cache_key(self, request):
+        return (
+            f'{self.cache_prefix}:{get_catalog_version()}:'
+            f'{request.get_full_path()}'
+        )
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        with primary_reads():
+            response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response.add_post_render_callback(
+                lambda rendered: cache.set(
+                    key,
+                    (rendered.content, rendered['Content-Type']),
+                    self.cache_timeout
+                )
+            )
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+
+class ConditionalGetMixin:
+    """Условные GET-запросы для list и retrieve.
+
+    Валидатор строится по уже загруженным объектам через get_etag_parts,
+    поэтому при совпадении If-None-Match ответ 304 отдаётся без
+    сериализации. Для деталки ETag сильный, для страниц списка слабый.
+    Last-Modified отдаётся только анонимам: для авторизованных ответ
+    зависит от их избранного и списка покупок, у которых нет даты.
+    """
+    def get_etag_parts(self, obj):
+        raise NotImplementedError
+
+    def get_last_modified(self, obj):
+        return None
+
+    def get_validators(self, objects, weak=False):
+        request = self.request
+        version = get_catalog_version()
+        parts = [str(version), str(request.user.pk)]
+        if weak:
+            parts.append(request.get_full_path())
+            page = getattr(self.paginator, 'page', None)
+            paginator = getattr(page, 'paginator', None)
+            if paginator is not None:
+                parts.append(str(paginator.count))
+            parts.append(str(getattr(self.paginator, 'has_next', '')))
+        dates = [datetime.fromtimestamp(version / 1e9, tz=timezone.utc)]
+        for obj in objects:
+            parts.extend(str(part) for part in self.get_etag_parts(obj))
+            dates.append(self.get_last_modified(obj))
+        digest = hashlib.sha1('|'.join(parts).encode()).hexdigest()
+        etag = f'W/"{digest}"' if weak else f'"{digest}"'
+        last_modified = None
+        if not request.user.is_authenticated and all(dates):
+            last_modified = max(dates)
+        return etag, last_modified
+
+    def is_not_modified(self, etag, last_modified):
+        if_none_match = self.request.headers.get('If-None-Match')
+        if if_none_match:
+            tags = parse_etags(if_none_match)
+            return '*' in tags or any(
+                tag.removeprefix('W/') == etag.removeprefix('W/')
+                for tag in tags
+            )
+        if_modified_since = self.request.headers.get('If-Modified-Since')
+        if if_modified_since and last_modified:
+            since = parse_http_date_safe(if_modified_since)
+            return (
+                since is not None
+                and int(last_modified.timestamp()) <= since
+            )
+        return False
+
+    def conditional_response(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def respond(self, objects, build_response, weak=False):
+        etag, last_modified = self.get_validators(objects, weak)
+        if self.is_not_modified(etag, last_modified):
+            registry.inc(
+                'foodgram_conditional_get_total', {'result': 'not_modified'}
+            )
+            return self.conditional_response(
+                HttpResponseNotModified(), etag, last_modified
+            )
+        response = build_response()
+        registry.inc('foodgram_conditional_get_total', {'result': 'full'})
+        response.add_post_render_callback(
+            lambda rendered: registry.inc(
+                'foodgram_conditional_get_bytes_total', {},
+                len(rendered.content)
+            )
+        )
+        return self.conditional_response(response, etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        objects = list(queryset) if page is None else page
+
+        def build_response():
+            serializer = self.get_serializer(objects, many=True)
+            if page is None:
+                return Response(serializer.data)
+            return self.get_paginated_response(serializer.data)
+
+        return self.respond(objects, build_response, weak=True)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return self.respond(
+            (instance,),
+            lambda: Response(self.get_serializer(instance).data)
+        )
@@ -1,32 +1,130 @@
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from collections import OrderedDict
 
-from rest_framework import pagination, status
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from recipes.feed import Feed
+from recipes.search import RankedRecipes
+from rest_framework import pagination
+from rest_framework.exceptions import NotAcceptable, NotFound
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def positive_int(value, cutoff):
+    """Положительное целое из параметра запроса, не больше cutoff."""
+    number = int(value)
+    if number < 1:
+        raise ValueError(value)
+    return min(number, cutoff)
 
 
 class PageNumberLimitPagination(pagination.PageNumberPagination):
     page_size_query_param = 'limit'
 
 
-class SubscriptionsPagination(pagination.PageNumberPagination):
+class KeysetPagination(pagination.BasePagination):
+    """Пагинация по курсору (pub_date, id) без COUNT и OFFSET.
+
+    Включается параметром pagination=cursor, размер страницы задаётся
+    тем же параметром limit. Каждая страница читается диапазоном по
+    индексу pub_date, поэтому глубина прокрутки не влияет на скорость.
+    Курсор задаёт порядок по дате, поэтому выборки с другой сортировкой,
+    например по релевантности поиска, так не листаются.
+    """
+    mode_query_param = 'pagination'
+    mode = 'cursor'
+    cursor_query_param = 'cursor'
     page_size_query_param = 'limit'
-    recipes_limit_query = 'recipes_limit'
+    page_size = 6
+    max_page_size = 100
+    invalid_cursor_message = 'Некорректный курсор.'
+    ordering_message = (
+        'pagination=cursor листает только по дате публикации, '
+        'с сортировкой по релевантности он недоступен.'
+    )
+    orderings = ((), ('-pub_date',), ('-pub_date', '-pk'))
+
+    @classmethod
+    def is_requested(cls, request):
+        return request.query_params.get(cls.mode_query_param) == cls.mode
+
+    def get_page_size(self, request):
+        try:
+            return positive_int(
+                request.query_params[self.page_size_query_param],
+                self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def encode_cursor(self, recipe):
+        raw = f'{recipe.pub_date.isoformat()}|{recipe.pk}'
+        return urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = urlsafe_b64decode(encoded.encode()).decode()
+            pub_date, pk = raw.rsplit('|', 1)
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk
+
+    def filter_queryset(self, queryset, cursor):
+        if isinstance(queryset, RankedRecipes) or (
+            tuple(queryset.query.order_by) not in self.orderings
+        ):
+            raise NotAcceptable(self.ordering_message)
+        queryset = queryset.order_by('-pub_date', '-pk')
+        if cursor is not None:
+            pub_date, pk = cursor
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            )
+        return queryset
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        if isinstance(queryset, Feed):
+            if cursor is not None:
+                queryset = queryset.older_than(*cursor)
+        else:
+            queryset = self.filter_queryset(queryset, cursor)
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        self.page = page[:page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_first_link(self):
+        return remove_query_param(self.base_url, self.cursor_query_param)
 
     def get_paginated_response(self, data):
-        recipes_limit = self.request.query_params.get(self.recipes_limit_query)
-        if recipes_limit:
-            try:
-                recipes_limit = int(recipes_limit)
-            except ValueError:
-                return Response(
-                    {'error: ': 'recipes_limit должно быть целым числом.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            for author in data:
-                author['recipes'] = author['recipes'][:recipes_limit]
         return Response(OrderedDict([
-            ('count', self.page.paginator.count),
             ('next', self.get_next_link()),
-            ('previous', self.get_previous_link()),
+            ('first', self.get_first_link()),
             ('results', data)
         ]))
+
+
+class SubscriptionsPagination(PageNumberLimitPagination):
+    recipes_limit_query = 'recipes_limit'
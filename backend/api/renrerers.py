@@ -1,5 +1,21 @@
-from rest_framework_csv import renderers as r
+import csv
 
+CART_HEADERS = ('Ингредиент', 'Мера измерения', 'Количество')
 
-class CSVCartRenderer (r.CSVRenderer):
-    headers = ('Ингредиент', 'Мера измерения', 'Количество')
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def stream_cart_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CART_HEADERS)
+    for ingredient in ingredients.iterator():
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['amount']
+        ))
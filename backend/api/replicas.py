@@ -0,0 +1,119 @@
+"""Чтение с реплик базы данных.
+
+ReplicaMiddleware отправляет запросы безопасными методами на одну из
+реплик из settings.DATABASE_REPLICAS, остальные — в основную базу.
+Клиент, который что-то записал, ещё REPLICA_PIN_SECONDS секунд читает
+из основной базы и видит свои изменения, пока реплика догоняет. Метка
+хранится в cookie, а для запросов с токеном ещё и в кеше, чтобы её
+видели клиенты без cookie. Метку в кеше видят все процессы только при
+общем кеше (CACHE_BACKEND с Redis или Memcached): LocMemCache по
+умолчанию у каждого процесса свой, и клиент без cookie, попав в другой
+процесс, прочитает с реплики устаревшие данные. Поэтому с репликами и
+несколькими процессами нужен общий кеш, иначе метку передаёт только
+cookie. Вне HTTP-запросов (команды, миграции) все запросы идут
+в основную базу.
+"""
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'primary_db'
+PIN_KEY = 'primary_db:{}'
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def pin_key(request):
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if not authorization:
+        return None
+    return PIN_KEY.format(
+        hashlib.sha256(authorization.encode()).hexdigest()
+    )
+
+
+def is_pinned(request):
+    if PIN_COOKIE in request.COOKIES:
+        return True
+    key = pin_key(request)
+    return key is not None and cache.get(key) is not None
+
+
+def pin(request, response):
+    seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+    response.set_cookie(
+        PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax'
+    )
+    key = pin_key(request)
+    if key is not None:
+        cache.set(key, 1, seconds)
+
+
+@contextmanager
+def primary_reads():
+    """Чтения внутри блока идут в основную базу."""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replicas = get_replicas()
+        if not replicas:
+            return self.get_response(request)
+        safe = request.method in SAFE_METHODS
+        alias = None
+        if safe and not is_pinned(request):
+            alias = random.choice(replicas)
+        token = _read_alias.set(alias)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        if not safe and response.status_code < 400:
+            pin(request, response)
+        return response
+
+
+class ReplicaRouter:
+    """Чтения текущего запроса — в выбранную middleware реплику.
+
+    После первой записи в запросе его чтения тоже уходят в основную
+    базу, чтобы не читать данные, которых на реплике ещё нет.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        if _read_alias.get() is not None:
+            _read_alias.set(None)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_replicas():
+            return False
+        return None
@@ -1,8 +1,13 @@
 from collections import OrderedDict
+from functools import partial
 
+from django.db import transaction
 from djoser.serializers import UserSerializer
 from drf_extra_fields.fields import Base64ImageField
-from recipes.models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
+from recipes.images import image_variants
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, RecipeTag,
+                            Tag, UploadedImage)
+from recipes.postings import ingredient_recipe_index
 from rest_framework import serializers
 from users.models import User
 
@@ -24,7 +29,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(min_value=1)
     name = serializers.CharField(source='ingredient.name', required=False)
     measurement_unit = serializers.CharField(
@@ -62,6 +67,8 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         return (
             self.context['request']
             and self.context['request'].user.is_authenticated
@@ -70,7 +77,22 @@ class CustomUserSerializer(UserSerializer):
         )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class ImageVariantsMixin:
+    def get_image_variants(self, obj):
+        variants = image_variants(obj.image)
+        request = self.context.get('request')
+        if request is None:
+            return variants
+        return {
+            name: {
+                extension: request.build_absolute_uri(url)
+                for extension, url in formats.items()
+            }
+            for name, formats in variants.items()
+        }
+
+
+class RecipeSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     tags = serializers.PrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True
     )
@@ -78,7 +100,13 @@ class RecipeSerializer(serializers.ModelSerializer):
     author = CustomUserSerializer(read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField()
+    image = Base64ImageField(required=False)
+    image_id = serializers.PrimaryKeyRelatedField(
+        queryset=UploadedImage.objects.all(),
+        write_only=True,
+        required=False
+    )
+    image_variants = serializers.SerializerMethodField()
     cooking_time = serializers.IntegerField(min_value=1)
 
     class Meta:
@@ -92,11 +120,15 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_id',
+            'image_variants',
             'text',
             'cooking_time'
         )
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return (
             self.context['request'].user.is_authenticated
             and self.context['request'].user.favorite_recipes.
@@ -104,51 +136,124 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return (
             self.context['request'].user.is_authenticated
             and self.context['request'].user.cart.filter(recipe=obj).exists()
         )
 
     def validate_ingredients(self, value):
-        if value:
-            return value
-        raise serializers.ValidationError('Добавьте хотя бы один ингредиент.')
+        if not value:
+            raise serializers.ValidationError(
+                'Добавьте хотя бы один ингредиент.'
+            )
+        ids = {ingredient['id'] for ingredient in value}
+        missing = ids - set(
+            Ingredient.objects.filter(pk__in=ids).values_list('pk', flat=True)
+        )
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не существуют: {sorted(missing)}.'
+            )
+        return value
 
     def validate_tags(self, value):
         if value:
             return value
         raise serializers.ValidationError('Добавьте хотя бы один тег.')
 
-    def add_ingredient(self, ingredient, instance):
-        current_ingredient, status = RecipeIngredient.objects.get_or_create(
-            recipe=instance,
-            ingredient=ingredient['id']
+    def validate_image_id(self, value):
+        if value.owner_id != self.context['request'].user.pk:
+            raise serializers.ValidationError('Изображение не найдено.')
+        return value
+
+    def validate(self, data):
+        if 'image' in data and 'image_id' in data:
+            raise serializers.ValidationError(
+                'Передайте либо image, либо image_id.'
+            )
+        if self.instance is None and not (
+            data.get('image') or data.get('image_id')
+        ):
+            raise serializers.ValidationError(
+                {'image': 'Добавьте изображение.'}
+            )
+        return data
+
+    @staticmethod
+    def use_uploaded_image(validated_data):
+        upload = validated_data.pop('image_id', None)
+        if upload is not None:
+            validated_data['image'] = upload.image.name
+        return upload
+
+    @staticmethod
+    def set_ingredients(recipe, ingredients, is_new=False):
+        amounts = {}
+        for ingredient in ingredients:
+            pk = ingredient['id']
+            amounts[pk] = amounts.get(pk, 0) + ingredient['amount']
+        to_update, to_delete = [], []
+        if not is_new:
+            for current in RecipeIngredient.objects.filter(recipe=recipe):
+                amount = amounts.pop(current.ingredient_id, None)
+                if amount is None:
+                    to_delete.append(current.pk)
+                elif current.amount != amount:
+                    current.amount = amount
+                    to_update.append(current)
+        if to_delete:
+            RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ('amount',))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient_id=pk, amount=amount)
+            for pk, amount in amounts.items()
+        )
+        transaction.on_commit(partial(
+            ingredient_recipe_index.update,
+            recipe.pk,
+            [ingredient['id'] for ingredient in ingredients]
+        ))
+
+    @staticmethod
+    def set_tags(recipe, tags, is_new=False):
+        tag_ids = {tag.pk for tag in tags}
+        to_delete = []
+        if not is_new:
+            for current in RecipeTag.objects.filter(recipe=recipe):
+                if current.tag_id in tag_ids:
+                    tag_ids.remove(current.tag_id)
+                else:
+                    to_delete.append(current.pk)
+        if to_delete:
+            RecipeTag.objects.filter(pk__in=to_delete).delete()
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=pk) for pk in tag_ids
         )
-        if status:
-            current_ingredient.amount = ingredient['amount']
-        else:
-            current_ingredient.amount += ingredient['amount']
-        current_ingredient.save()
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
+        upload = self.use_uploaded_image(validated_data)
         recipe = Recipe.objects.create(**validated_data)
-        for ingredient_obj in ingredients:
-            self.add_ingredient(ingredient_obj, recipe)
-        for tag in tags:
-            RecipeTag.objects.get_or_create(recipe=recipe, tag=tag)
+        if upload is not None:
+            upload.delete()
+        self.set_ingredients(recipe, ingredients, is_new=True)
+        self.set_tags(recipe, tags, is_new=True)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        instance.ingredients_lst.all().delete()
-        instance.tags_lst.all().delete()
-        for ingredient_obj in ingredients:
-            self.add_ingredient(ingredient_obj, instance)
-        for tag in tags:
-            RecipeTag.objects.create(recipe=instance, tag=tag)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        upload = self.use_uploaded_image(validated_data)
+        if ingredients is not None:
+            self.set_ingredients(instance, ingredients)
+        if tags is not None:
+            self.set_tags(instance, tags)
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
@@ -156,6 +261,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
         instance.image = validated_data.get('image', instance.image)
         instance.save()
+        if upload is not None:
+            upload.delete()
         return instance
 
     def to_representation(self, instance):
@@ -165,6 +272,10 @@ class RecipeSerializer(serializers.ModelSerializer):
         for field in fields:
             if field.field_name == 'ingredients':
                 attribute = instance.ingredients_lst.all()
+                if 'ingredients_lst' not in getattr(
+                    instance, '_prefetched_objects_cache', {}
+                ):
+                    attribute = attribute.select_related('ingredient')
             else:
                 attribute = field.get_attribute(instance)
 
@@ -178,8 +289,10 @@ class RecipeSerializer(serializers.ModelSerializer):
         return ret
 
 
-class FavoriteRecipeSerializer(serializers.ModelSerializer):
+class FavoriteRecipeSerializer(ImageVariantsMixin,
+                               serializers.ModelSerializer):
     image = Base64ImageField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -187,16 +300,21 @@ class FavoriteRecipeSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         )
 
 
+class UploadedImageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadedImage
+        fields = ('id', 'image')
+        read_only_fields = fields
+
+
 class FollowUserSerializer(CustomUserSerializer):
     recipes = FavoriteRecipeSerializer(many=True, read_only=True)
-    recipes_count = serializers.SerializerMethodField()
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -0,0 +1,38 @@
+"""Денормализованные счётчики рецептов и пользователей."""
+from django.test import TestCase
+from recipes.models import Favorite, Follow, Recipe
+
+from .utils import make_author, make_recipe
+
+
+class CounterTests(TestCase):
+
+    def setUp(self):
+        self.author = make_author(1)
+        self.reader = make_author(2)
+        self.recipe = make_recipe(self.author, (), ())
+
+    def test_save_of_stale_instance_keeps_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        author = type(self.author).objects.get(pk=self.author.pk)
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        Follow.objects.create(user=self.reader, author=self.author)
+        recipe.name = 'Новое название'
+        recipe.save()
+        author.first_name = 'Автор'
+        author.save()
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(author.recipes_count, 1)
+        self.assertEqual(author.followers_count, 1)
+
+    def test_decrement_does_not_go_below_zero(self):
+        favorite = Favorite.objects.create(
+            user=self.reader, recipe=self.recipe
+        )
+        Recipe.objects.filter(pk=self.recipe.pk).update(favorites_count=0)
+        favorite.delete()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
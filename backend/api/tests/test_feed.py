@@ -0,0 +1,146 @@
+"""Лента подписок: раскладка по лентам, знаменитости и обрезка."""
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from recipes.models import FeedEntry, Follow, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .utils import make_author, make_recipe
+
+FEED = '/api/recipes/feed/'
+
+
+@override_settings(
+    FEED_FANOUT_LIMIT=1, FEED_MAX_LENGTH=3, DATABASE_REPLICAS=[]
+)
+class FeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = make_author('reader')
+        cls.token = Token.objects.create(user=cls.reader)
+        cls.tag = Tag.objects.create(
+            name='Обед', color='#49B64E', slug='lunch'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def publish(self, author, count):
+        return [
+            make_recipe(author, (), (self.tag,), name=f'{author} {number}')
+            for number in range(count)
+        ]
+
+    def feed_ids(self, query=''):
+        response = self.client.get(FEED + query)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        results = data if isinstance(data, list) else data['results']
+        return [recipe['id'] for recipe in results], data
+
+    def test_feed_merges_copied_and_celebrity_recipes_by_date(self):
+        author = make_author('author')
+        celebrity = make_author('celebrity')
+        Follow.objects.create(user=self.reader, author=author)
+        Follow.objects.create(user=self.reader, author=celebrity)
+        Follow.objects.create(user=make_author('fan'), author=celebrity)
+        recipes = []
+        for _ in range(2):
+            recipes += self.publish(author, 1) + self.publish(celebrity, 1)
+        self.assertFalse(
+            FeedEntry.objects.filter(recipe__author=celebrity).exists()
+        )
+        expected = [recipe.pk for recipe in reversed(recipes)]
+
+        ids, _ = self.feed_ids()
+        self.assertEqual(ids, expected)
+        ids, data = self.feed_ids('?limit=3&page=2')
+        self.assertEqual(ids, expected[3:])
+        self.assertEqual(data['count'], 4)
+
+    def test_cursor_pages_walk_feed_without_gaps(self):
+        author = make_author('author')
+        celebrity = make_author('celebrity')
+        Follow.objects.create(user=self.reader, author=author)
+        Follow.objects.create(user=self.reader, author=celebrity)
+        Follow.objects.create(user=make_author('fan'), author=celebrity)
+        recipes = self.publish(author, 2) + self.publish(celebrity, 2)
+        query, seen = '?pagination=cursor&limit=1', []
+        while query:
+            ids, data = self.feed_ids(query)
+            seen += ids
+            query = data['next'] and '?' + data['next'].split('?', 1)[1]
+        self.assertEqual(seen, [recipe.pk for recipe in reversed(recipes)])
+
+    def test_celebrity_recipes_copied_before_are_not_duplicated(self):
+        celebrity = make_author('celebrity')
+        Follow.objects.create(user=self.reader, author=celebrity)
+        recipes = self.publish(celebrity, 2)
+        Follow.objects.create(user=make_author('fan'), author=celebrity)
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(), 2)
+
+        ids, data = self.feed_ids('?limit=10')
+        self.assertEqual(ids, [recipe.pk for recipe in reversed(recipes)])
+        self.assertEqual(data['count'], 2)
+
+    def test_publishing_trims_followers_feeds(self):
+        author = make_author('author')
+        Follow.objects.create(user=self.reader, author=author)
+        recipes = self.publish(author, 5)
+        newest = [recipe.pk for recipe in reversed(recipes)][:3]
+        self.assertEqual(
+            sorted(FeedEntry.objects.filter(
+                user=self.reader
+            ).values_list('recipe_id', flat=True)),
+            sorted(newest)
+        )
+
+    def test_feed_is_read_to_max_length_and_trimmed_by_command(self):
+        author = make_author('author')
+        recipes = self.publish(author, 5)
+        FeedEntry.objects.bulk_create(
+            FeedEntry(user=self.reader, recipe=recipe,
+                      pub_date=recipe.pub_date)
+            for recipe in recipes
+        )
+        Follow.objects.bulk_create((Follow(user=self.reader, author=author),))
+        newest = [recipe.pk for recipe in reversed(recipes)][:3]
+
+        ids, data = self.feed_ids('?limit=10')
+        self.assertEqual(ids, newest)
+        self.assertEqual(data['count'], 3)
+        query, seen = '?pagination=cursor&limit=2', []
+        while query:
+            ids, data = self.feed_ids(query)
+            seen += ids
+            query = data['next'] and '?' + data['next'].split('?', 1)[1]
+        self.assertEqual(seen, newest)
+
+        call_command('trim_feeds', stdout=StringIO())
+        self.assertEqual(
+            sorted(FeedEntry.objects.filter(
+                user=self.reader
+            ).values_list('recipe_id', flat=True)),
+            sorted(newest)
+        )
+
+    def test_follow_copies_latest_recipes_and_unfollow_removes_them(self):
+        author = make_author('author')
+        recipes = self.publish(author, 4)
+        response = self.client.post(f'/api/users/{author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 1)
+        self.assertEqual(
+            self.feed_ids()[0], [recipe.pk for recipe in reversed(recipes)][:3]
+        )
+
+        response = self.client.delete(f'/api/users/{author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 204)
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 0)
+        self.assertEqual(self.feed_ids()[0], [])
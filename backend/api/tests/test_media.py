@@ -0,0 +1,124 @@
+"""Подсчёт ссылок на медиафайлы и их удаление."""
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from recipes.images import render_derivatives
+from recipes.models import MediaFile, Recipe, UploadedImage
+from recipes.storage import (ContentAddressedStorage,
+                             delete_if_unreferenced, release)
+
+from .utils import (TEST_IMAGE, TemporaryMediaMixin, make_author,
+                    make_recipe, png_bytes)
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class MediaReferenceTests(TemporaryMediaMixin, TestCase):
+
+    def setUp(self):
+        self.owner = make_author(1)
+
+    def upload(self, size=(10, 10)):
+        return UploadedImage.objects.create(
+            owner=self.owner,
+            image=ContentFile(png_bytes(size), name='photo.png')
+        )
+
+    def references(self, name):
+        return MediaFile.objects.filter(name=name).values_list(
+            'references', flat=True
+        ).first()
+
+    def test_same_content_is_stored_once_and_counted(self):
+        first, second = self.upload(), self.upload()
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(self.references(name), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(self.references(name), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertIsNone(self.references(name))
+
+    def test_recipe_takes_over_uploaded_image(self):
+        upload = self.upload()
+        name = upload.image.name
+        recipe = make_recipe(self.owner, (), ())
+        Recipe.objects.get(pk=recipe.pk).save()
+        self.assertEqual(self.references(name), 1)
+
+        recipe.image = name
+        recipe.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            upload.delete()
+        self.assertEqual(self.references(name), 1)
+        self.assertTrue(default_storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.image = self.upload(size=(20, 20)).image.name
+            recipe.save()
+        self.assertIsNone(self.references(name))
+        self.assertFalse(default_storage.exists(name))
+
+    def test_collect_racing_with_upload_keeps_file(self):
+        name = self.upload().image.name
+        release(name)
+        exists = ContentAddressedStorage.exists
+
+        def exists_then_collect(storage, path):
+            # сборщик срабатывает сразу после проверки наличия файла
+            found = exists(storage, path)
+            if path == name:
+                delete_if_unreferenced(name)
+            return found
+
+        with mock.patch.object(
+            ContentAddressedStorage, 'exists', exists_then_collect
+        ):
+            again = self.upload()
+        self.assertEqual(again.image.name, name)
+        self.assertEqual(self.references(name), 1)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_derivatives_are_built_only_for_new_images(self):
+        with mock.patch('recipes.signals.schedule_derivatives') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe = make_recipe(self.owner, (), ())
+                Recipe.objects.get(pk=recipe.pk).save()
+                recipe.favorites_count = 1
+                recipe.save(update_fields=('favorites_count',))
+                recipe.image = self.upload().image.name
+                recipe.save()
+        self.assertEqual(
+            [call.args for call in schedule.call_args_list],
+            [(TEST_IMAGE,), (recipe.image.name,)]
+        )
+
+    def test_existing_derivatives_do_not_decode_original(self):
+        path = default_storage.path(self.upload().image.name)
+        with mock.patch('recipes.images.Image.open') as open_image:
+            render_derivatives(path, [(path, None, 'WEBP')])
+        open_image.assert_not_called()
+
+    def test_expired_uploads_are_deleted_with_their_files(self):
+        expired, fresh = self.upload(), self.upload(size=(20, 20))
+        UploadedImage.objects.filter(pk=expired.pk).update(
+            created=timezone.now() - timedelta(days=2)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('collect_media_garbage', stdout=StringIO())
+        self.assertQuerysetEqual(
+            UploadedImage.objects.all(), [fresh.pk], transform=lambda u: u.pk
+        )
+        self.assertFalse(default_storage.exists(expired.image.name))
+        self.assertTrue(default_storage.exists(fresh.image.name))
@@ -0,0 +1,52 @@
+"""Метрики запросов: потоковые ответы замеряются до конца отдачи тела."""
+import json
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Cart, Ingredient
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.metrics import registry
+
+from .utils import make_author, make_recipe
+
+VIEW = json.dumps({'view': 'RecipeViewSet.download_shopping_cart'})
+
+
+def observed(name):
+    series = registry.histograms[name].get(VIEW, {'sum': 0, 'count': 0})
+    return series['count'], series['sum']
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class StreamingMetricsTests(TestCase):
+
+    def setUp(self):
+        reader = make_author(1)
+        salt = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        Cart.objects.create(
+            user=reader, recipe=make_recipe(reader, (salt,), ())
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=reader)}'
+        )
+
+    def test_streamed_cart_counts_queries_and_bytes(self):
+        queries_before = observed('foodgram_db_queries')
+        size_before = observed('foodgram_response_size_bytes')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/download_shopping_cart/')
+            self.assertEqual(
+                observed('foodgram_db_queries'), queries_before
+            )
+            body = b''.join(response.streaming_content)
+
+        self.assertEqual(observed('foodgram_db_queries'), (
+            queries_before[0] + 1, queries_before[1] + len(context)
+        ))
+        self.assertEqual(observed('foodgram_response_size_bytes'), (
+            size_before[0] + 1, size_before[1] + len(body)
+        ))
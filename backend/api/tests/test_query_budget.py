@@ -0,0 +1,281 @@
+"""Бюджеты SQL-запросов для эндпоинтов API.
+
+Каждый эндпоинт роутера из api/urls.py вызывается при малом и большом
+объёме данных. Тест падает, если число запросов растёт вместе с размером
+ответа или превышает объявленный для эндпоинта бюджет.
+"""
+import base64
+from typing import Callable, NamedTuple, Optional
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from recipes.cache import forget_catalog_version
+from recipes.models import Cart, Favorite, Follow, Ingredient, Tag
+from recipes.postings import ingredient_recipe_index
+from recipes.search import ingredient_index, recipe_index
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import User
+
+from api.urls import router
+
+from .utils import (QueryBudgetMixin, TemporaryMediaMixin, make_author,
+                    make_recipe, png_bytes)
+
+SMALL = 2
+LARGE = 8
+PASSWORD = 'Secret-password-1'
+IMAGE = 'data:image/png;base64,' + base64.b64encode(png_bytes()).decode()
+
+
+class Case(NamedTuple):
+    url_name: str
+    method: str
+    path: str
+    budget: int
+    status: int = status.HTTP_200_OK
+    data: Optional[Callable] = None
+    prepare: Optional[Callable] = None
+    anonymous: bool = False
+    format: str = 'json'
+
+    @property
+    def label(self):
+        user = 'anonymous' if self.anonymous else 'reader'
+        return f'{self.method} {self.path} ({user})'
+
+
+def recipe_data(targets):
+    return {
+        'name': 'Новый рецепт',
+        'text': 'Описание',
+        'cooking_time': 15,
+        'image': IMAGE,
+        'tags': [targets['tag']],
+        'ingredients': [
+            {'id': pk, 'amount': 10} for pk in targets['ingredients']
+        ]
+    }
+
+
+def add_favorite(reader, targets):
+    Favorite.objects.create(user=reader, recipe_id=targets['recipe'])
+
+
+def add_to_cart(reader, targets):
+    Cart.objects.create(user=reader, recipe_id=targets['recipe'])
+
+
+def follow(reader, targets):
+    Follow.objects.create(user=reader, author_id=targets['author'])
+
+
+CASES = (
+    Case('api-root', 'get', '/api/', 0, anonymous=True),
+    Case('tag-list', 'get', '/api/tags/', 3),
+    Case('tag-detail', 'get', '/api/tags/{tag}/', 3),
+    Case('ingredient-list', 'get', '/api/ingredients/', 3),
+    Case('ingredient-list', 'get', '/api/ingredients/?name=Инг', 4),
+    Case('ingredient-detail', 'get', '/api/ingredients/{ingredient}/', 3),
+    Case('recipe-list', 'get', '/api/recipes/?limit=100', 7),
+    Case('recipe-list', 'get', '/api/recipes/?limit=100', 6,
+         anonymous=True),
+    Case('recipe-list', 'get',
+         '/api/recipes/?pagination=cursor&limit=100', 6),
+    Case('recipe-list', 'get',
+         '/api/recipes/?is_favorited=1&is_in_shopping_cart=1&limit=100',
+         7),
+    Case('recipe-list', 'get', '/api/recipes/?search=рецепт&limit=100', 7),
+    Case('recipe-list', 'get',
+         '/api/recipes/?ingredients={ingredient_ids}&match=most&limit=100',
+         7),
+    Case('recipe-list', 'post', '/api/recipes/', 17,
+         status=status.HTTP_201_CREATED, data=recipe_data),
+    Case('recipe-detail', 'get', '/api/recipes/{recipe}/', 6),
+    Case('recipe-detail', 'get', '/api/recipes/{recipe}/', 5,
+         anonymous=True),
+    Case('recipe-detail', 'put', '/api/recipes/{own}/', 19,
+         data=recipe_data),
+    Case('recipe-detail', 'patch', '/api/recipes/{own}/', 11,
+         data=lambda targets: {'cooking_time': 20}),
+    Case('recipe-detail', 'delete', '/api/recipes/{own}/', 13,
+         status=status.HTTP_204_NO_CONTENT),
+    Case('recipe-feed', 'get', '/api/recipes/feed/?limit=100', 8),
+    Case('recipe-download-shopping-cart', 'get',
+         '/api/recipes/download_shopping_cart/', 2),
+    Case('recipe-favorite', 'post', '/api/recipes/{recipe}/favorite/', 10,
+         status=status.HTTP_201_CREATED),
+    Case('recipe-favorite', 'delete', '/api/recipes/{recipe}/favorite/',
+         8, status=status.HTTP_204_NO_CONTENT, prepare=add_favorite),
+    Case('recipe-shopping-cart', 'post',
+         '/api/recipes/{recipe}/shopping_cart/', 10,
+         status=status.HTTP_201_CREATED),
+    Case('recipe-shopping-cart', 'delete',
+         '/api/recipes/{recipe}/shopping_cart/', 8,
+         status=status.HTTP_204_NO_CONTENT, prepare=add_to_cart),
+    Case('user-list', 'get', '/api/users/?limit=100', 2),
+    Case('user-list', 'get', '/api/users/?limit=100', 1, anonymous=True),
+    Case('user-list', 'post', '/api/users/', 5,
+         status=status.HTTP_201_CREATED, anonymous=True,
+         data=lambda targets: {
+             'email': f'new{targets["author"]}@example.com',
+             'username': f'new{targets["author"]}',
+             'first_name': 'Новый',
+             'last_name': 'Пользователь',
+             'password': PASSWORD
+         }),
+    Case('user-detail', 'get', '/api/users/{author}/', 2),
+    Case('user-detail', 'patch', '/api/users/{user}/', 4,
+         data=lambda targets: {'first_name': 'Читатель'}),
+    Case('user-me', 'get', '/api/users/me/', 2),
+    Case('user-me', 'patch', '/api/users/me/', 3,
+         data=lambda targets: {'last_name': 'Читателев'}),
+    Case('user-set-password', 'post', '/api/users/set_password/', 2,
+         status=status.HTTP_204_NO_CONTENT,
+         data=lambda targets: {
+             'current_password': PASSWORD, 'new_password': PASSWORD
+         }),
+    Case('user-get-subscriptions', 'get',
+         '/api/users/subscriptions/?limit=100', 4),
+    Case('user-get-subscriptions', 'get',
+         '/api/users/subscriptions/?limit=100&recipes_limit=1', 4),
+    Case('user-subscribe', 'post', '/api/users/{author}/subscribe/', 12,
+         status=status.HTTP_201_CREATED),
+    Case('user-subscribe', 'delete', '/api/users/{author}/subscribe/', 6,
+         status=status.HTTP_204_NO_CONTENT, prepare=follow),
+    Case('uploadedimage-list', 'post', '/api/images/', 4,
+         status=status.HTTP_201_CREATED, format='multipart',
+         data=lambda targets: {'image': SimpleUploadedFile(
+             'photo.png', png_bytes(), content_type='image/png'
+         )}),
+)
+
+# Сценарии djoser для подтверждения почты и сброса пароля не читают
+# коллекций и требуют писем с токенами, поэтому бюджеты для них не заданы.
+EXCLUDED = {
+    'user-activation',
+    'user-resend-activation',
+    'user-reset-password',
+    'user-reset-password-confirm',
+    'user-reset-username',
+    'user-reset-username-confirm',
+    'user-set-username',
+}
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    DATABASE_REPLICAS=[]
+)
+class QueryBudgetTests(TemporaryMediaMixin, QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            first_name='Читатель',
+            last_name='Тестов',
+            password=PASSWORD
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+
+    def setUp(self):
+        self.targets_created = 0
+
+    def test_every_router_endpoint_has_budget(self):
+        names = {url.name for url in router.urls}
+        covered = {case.url_name for case in CASES} | EXCLUDED
+        self.assertEqual(
+            names - covered, set(),
+            'Для новых эндпоинтов нужно объявить бюджет запросов.'
+        )
+
+    def test_queries_within_budget_and_do_not_scale(self):
+        self.populate(0, SMALL)
+        small = self.measure_all('small')
+        self.populate(SMALL, LARGE)
+        large = self.measure_all('large')
+        for case, small_context, large_context in zip(CASES, small, large):
+            with self.subTest(case.label, check='scaling'):
+                self.assertQueriesDoNotScale(small_context, large_context)
+
+    def test_warm_catalog_reads_skip_database(self):
+        self.populate(0, SMALL)
+        client = APIClient()
+        for path in ('/api/tags/', '/api/ingredients/?name=Инг'):
+            with self.subTest(path):
+                client.get(path)
+                with self.assertNumQueries(0):
+                    response = client.get(path)
+                self.assertEqual(response.status_code, 200)
+
+    def populate(self, start, stop):
+        """Авторы с рецептами, на которых подписан читатель."""
+        for number in range(start, stop):
+            ingredients = Ingredient.objects.bulk_create(
+                Ingredient(name=f'Ингредиент {number}-{index}',
+                           measurement_unit='г')
+                for index in range(3)
+            )
+            tag = Tag.objects.create(
+                name=f'Тег {number}',
+                color=f'#{number:06d}',
+                slug=f'tag{number}'
+            )
+            author = make_author(number)
+            Follow.objects.create(user=self.reader, author=author)
+            for index in range(2):
+                recipe = make_recipe(
+                    author, ingredients, (tag,),
+                    name=f'Рецепт {number}-{index}'
+                )
+                Favorite.objects.create(user=self.reader, recipe=recipe)
+                Cart.objects.create(user=self.reader, recipe=recipe)
+
+    def make_targets(self):
+        self.targets_created += 1
+        author = make_author(f'target{self.targets_created}')
+        ingredients = list(Ingredient.objects.order_by('pk')[:3])
+        tag = Tag.objects.order_by('pk').first()
+        return {
+            'user': self.reader.pk,
+            'author': author.pk,
+            'recipe': make_recipe(author, ingredients, (tag,)).pk,
+            'own': make_recipe(self.reader, ingredients, (tag,)).pk,
+            'tag': tag.pk,
+            'ingredient': ingredients[0].pk,
+            'ingredients': [ingredient.pk for ingredient in ingredients],
+            'ingredient_ids': ','.join(
+                str(ingredient.pk) for ingredient in ingredients
+            ),
+        }
+
+    def measure_all(self, size):
+        return [self.measure(case, size) for case in CASES]
+
+    def measure(self, case, size):
+        targets = self.make_targets()
+        if case.prepare:
+            case.prepare(self.reader, targets)
+        client = APIClient()
+        if not case.anonymous:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        data = case.data(targets) if case.data else None
+        request = getattr(client, case.method)
+        cache.clear()
+        forget_catalog_version()
+        ingredient_index.invalidate()
+        recipe_index.invalidate()
+        ingredient_recipe_index.invalidate()
+        with self.subTest(case.label, size=size):
+            with self.assertQueryBudget(case.budget) as context:
+                response = request(
+                    case.path.format(**targets), data, format=case.format
+                )
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            self.assertEqual(response.status_code, case.status)
+        return context
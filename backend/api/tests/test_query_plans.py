@@ -0,0 +1,115 @@
+"""Планы горячих запросов к таблицам связей.
+
+База заполняется командой seed_data, затем запросы, которые выполняют
+представления API, проверяются через EXPLAIN: ни одна таблица не должна
+читаться полным сканированием.
+"""
+import re
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Exists, OuterRef, Sum
+from django.test import TestCase
+from recipes.models import (Cart, Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient)
+from recipes.tags import filter_by_tags, tag_ids
+from users.models import User
+
+from .utils import TemporaryMediaMixin
+
+SQLITE_FULL_SCAN = re.compile(r'\bSCAN (?!.*\bUSING\b)(?!CONSTANT ROW)(\S+)')
+POSTGRES_FULL_SCAN = re.compile(r'Seq Scan on (\S+)')
+
+
+class QueryPlanTests(TemporaryMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(50)
+        )
+        call_command(
+            'seed_data',
+            users=100,
+            recipes=1000,
+            follows=1500,
+            favorites=3000,
+            carts=500,
+            stdout=StringIO()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user = User.objects.filter(following__isnull=False).first()
+        cls.author = cls.user.following.first().author
+        cls.recipe = Recipe.objects.filter(cart__user=cls.user).first()
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        elif connection.vendor != 'sqlite':
+            self.skipTest('Разбор планов есть только для SQLite и PostgreSQL.')
+
+    def assertUsesIndexes(self, queryset):
+        plan = queryset.explain()
+        pattern = (
+            POSTGRES_FULL_SCAN if connection.vendor == 'postgresql'
+            else SQLITE_FULL_SCAN
+        )
+        scans = pattern.findall(plan)
+        self.assertFalse(
+            scans, f'Полное сканирование {", ".join(scans)}:\n{plan}'
+        )
+
+    def test_relation_lookups(self):
+        user, recipe = self.user, self.recipe
+        for queryset in (
+            user.cart.filter(recipe=recipe),
+            user.favorite_recipes.filter(recipe=recipe),
+            user.following.filter(author=self.author),
+            Follow.objects.filter(author=self.author),
+        ):
+            with self.subTest(str(queryset.query)):
+                self.assertUsesIndexes(queryset)
+
+    def test_user_filters(self):
+        user = self.user
+        for queryset in (
+            User.objects.filter(follower__user=user),
+            Recipe.objects.filter(follower__user=user),
+            Recipe.objects.filter(cart__user=user),
+            Recipe.objects.annotate(
+                is_favorited=Exists(
+                    Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+                ),
+                is_in_shopping_cart=Exists(
+                    Cart.objects.filter(user=user, recipe=OuterRef('pk'))
+                )
+            )[:6],
+        ):
+            with self.subTest(str(queryset.query)):
+                self.assertUsesIndexes(queryset)
+
+    def test_recipe_components(self):
+        for queryset in (
+            RecipeIngredient.objects.filter(recipe=self.recipe),
+            self.recipe.tags.all(),
+            RecipeIngredient.objects.filter(
+                recipe__cart__user=self.user
+            ).values(
+                'ingredient__name', 'ingredient__measurement_unit'
+            ).annotate(amount=Sum('amount')),
+        ):
+            with self.subTest(str(queryset.query)):
+                self.assertUsesIndexes(queryset)
+
+    def test_tag_filter_without_limit(self):
+        ids, _ = tag_ids.ids(('breakfast', 'dinner'))
+        for queryset in (
+            filter_by_tags(Recipe.objects.order_by(), ids).values('pk'),
+            filter_by_tags(Recipe.objects.order_by(), ids[:1]),
+        ):
+            with self.subTest(str(queryset.query)):
+                self.assertUsesIndexes(queryset)
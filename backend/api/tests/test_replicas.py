@@ -0,0 +1,203 @@
+"""Маршрутизация запросов между основной базой и репликами.
+
+Решения роутера проверяются без базы. Проверка на настоящих запросах
+запускается, когда реплики настроены, например локально двумя
+псевдонимами одной базы SQLite:
+    DB_ENGINE=django.db.backends.sqlite3 DB_REPLICA_HOSTS=localhost \\
+        python manage.py test api.tests.test_replicas
+"""
+import unittest
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from recipes.models import CatalogVersion, Ingredient, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.replicas import PIN_COOKIE, ReplicaMiddleware, primary_reads
+
+from .utils import TemporaryMediaMixin, make_author, make_recipe
+
+REPLICA = 'replica_1'
+TOKEN = 'Token 0123456789abcdef'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], REPLICA_PIN_SECONDS=5)
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def call(self, request, status=200, write=False):
+        """Пропускает запрос через middleware и возвращает ответ и базы,
+        из которых представление читало до и после записи."""
+        databases = []
+
+        def view(request):
+            databases.append(router.db_for_read(Recipe))
+            if write:
+                router.db_for_write(Recipe)
+                databases.append(router.db_for_read(Recipe))
+            return HttpResponse(status=status)
+
+        return ReplicaMiddleware(view)(request), databases
+
+    def test_safe_requests_read_from_replica(self):
+        for method in ('get', 'head', 'options'):
+            with self.subTest(method):
+                request = getattr(self.factory, method)('/api/recipes/')
+                _, databases = self.call(request)
+                self.assertEqual(databases, [REPLICA])
+        self.assertEqual(router.db_for_write(Recipe), DEFAULT_DB_ALIAS)
+
+    def test_outside_requests_use_primary(self):
+        self.assertEqual(router.db_for_read(Recipe), DEFAULT_DB_ALIAS)
+
+    def test_write_pins_client_to_primary(self):
+        response, databases = self.call(
+            self.factory.post('/api/recipes/1/favorite/'), status=201
+        )
+        self.assertEqual(databases, [DEFAULT_DB_ALIAS])
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+        request = self.factory.get('/api/recipes/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        _, databases = self.call(request)
+        self.assertEqual(databases, [DEFAULT_DB_ALIAS])
+
+    def test_write_pins_token_without_cookie(self):
+        self.call(
+            self.factory.delete(
+                '/api/recipes/1/favorite/', HTTP_AUTHORIZATION=TOKEN
+            ),
+            status=204
+        )
+        _, databases = self.call(
+            self.factory.get('/api/recipes/', HTTP_AUTHORIZATION=TOKEN)
+        )
+        self.assertEqual(databases, [DEFAULT_DB_ALIAS])
+        _, databases = self.call(self.factory.get(
+            '/api/recipes/', HTTP_AUTHORIZATION='Token other'
+        ))
+        self.assertEqual(databases, [REPLICA])
+
+    def test_failed_write_does_not_pin(self):
+        response, _ = self.call(
+            self.factory.post('/api/recipes/', HTTP_AUTHORIZATION=TOKEN),
+            status=400
+        )
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        _, databases = self.call(
+            self.factory.get('/api/recipes/', HTTP_AUTHORIZATION=TOKEN)
+        )
+        self.assertEqual(databases, [REPLICA])
+
+    def test_reads_after_write_in_safe_request_use_primary(self):
+        _, databases = self.call(
+            self.factory.get('/api/recipes/'), write=True
+        )
+        self.assertEqual(databases, [REPLICA, DEFAULT_DB_ALIAS])
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_uses_primary(self):
+        response, databases = self.call(self.factory.get('/api/recipes/'))
+        self.assertEqual(databases, [DEFAULT_DB_ALIAS])
+        response, _ = self.call(
+            self.factory.post('/api/recipes/1/favorite/'), status=201
+        )
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_primary_reads_block_uses_primary(self):
+        databases = []
+
+        def view(request):
+            with primary_reads():
+                databases.append(router.db_for_read(Tag))
+            databases.append(router.db_for_read(Tag))
+            return HttpResponse()
+
+        ReplicaMiddleware(view)(self.factory.get('/api/tags/'))
+        self.assertEqual(databases, [DEFAULT_DB_ALIAS, REPLICA])
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(router.allow_migrate(REPLICA, 'recipes'))
+        self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, 'recipes'))
+
+
+@unittest.skipUnless(
+    settings.DATABASE_REPLICAS, 'Реплики не настроены (DB_REPLICA_HOSTS).'
+)
+class ReplicaDatabaseTests(TemporaryMediaMixin, TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.replica = settings.DATABASE_REPLICAS[0]
+        author = make_author(1)
+        self.recipe = make_recipe(
+            author,
+            [Ingredient.objects.create(name='Соль', measurement_unit='г')],
+            [Tag.objects.create(name='Обед', color='#49B64E', slug='lunch')]
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=author)}'
+        )
+
+    def get(self, path):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary:
+            with CaptureQueriesContext(
+                connections[self.replica]
+            ) as replica:
+                response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        # Версия справочников всегда читается из основной базы.
+        primary = [
+            query for query in primary.captured_queries
+            if CatalogVersion._meta.db_table not in query['sql']
+        ]
+        return len(primary), len(replica)
+
+    @override_settings(DATABASE_REPLICAS=settings.DATABASE_REPLICAS[:1])
+    def test_reads_stick_to_primary_after_write(self):
+        path = f'/api/recipes/{self.recipe.pk}/'
+        primary, replica = self.get(path)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+        response = self.client.post(f'{path}favorite/')
+        self.assertEqual(response.status_code, 201)
+        primary, replica = self.get(path)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        cache.clear()
+        self.client.cookies.clear()
+        primary, replica = self.get(path)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    @override_settings(DATABASE_REPLICAS=settings.DATABASE_REPLICAS[:1])
+    def test_catalog_cache_is_filled_from_primary(self):
+        self.client.credentials()
+        for path in ('/api/tags/', '/api/ingredients/?name=Со'):
+            with self.subTest(path):
+                primary, replica = self.get(path)
+                self.assertGreater(primary, 0)
+                self.assertEqual(replica, 0)
+                self.assertEqual(self.get(path), (0, 0))
+
+    @override_settings(DATABASE_REPLICAS=settings.DATABASE_REPLICAS[:1])
+    def test_tag_ids_are_read_from_primary(self):
+        with CaptureQueriesContext(connections[self.replica]) as replica:
+            self.client.get('/api/recipes/?tags=lunch&limit=6')
+        tag_ids = 'SELECT "{}"."slug"'.format(Tag._meta.db_table)
+        self.assertFalse(any(
+            query['sql'].startswith(tag_ids)
+            for query in replica.captured_queries
+        ))
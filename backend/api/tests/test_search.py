@@ -0,0 +1,217 @@
+"""Поиск рецептов по тексту и по набору ингредиентов."""
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from recipes.postings import ingredient_recipe_index
+from recipes.search import ingredient_index, recipe_index
+from rest_framework.test import APIClient
+
+from .utils import TEST_IMAGE, make_author, make_recipe
+
+RECIPES = '/api/recipes/'
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class SearchTests(TestCase):
+
+    def setUp(self):
+        recipe_index.invalidate()
+        self.client = APIClient()
+        self.author = make_author(1)
+
+    def search_ids(self, query):
+        response = self.client.get(RECIPES + query + '&limit=10')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_name_matches_rank_above_text_matches(self):
+        in_text = make_recipe(self.author, (), (), name='Окрошка')
+        Recipe.objects.filter(pk=in_text.pk).update(text='Холодный суп')
+        older = make_recipe(self.author, (), (), name='Суп гороховый')
+        newer = make_recipe(self.author, (), (), name='Суп томатный')
+        twice = make_recipe(self.author, (), (), name='Суп')
+        Recipe.objects.filter(pk=twice.pk).update(text='Суп на каждый день')
+        make_recipe(self.author, (), (), name='Салат')
+
+        self.assertEqual(
+            self.search_ids('?search=суп'),
+            [twice.pk, newer.pk, older.pk, in_text.pk]
+        )
+        self.assertEqual(
+            self.search_ids('?search=суп томат'), [newer.pk]
+        )
+
+    def make_soups(self, count):
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=self.author, name=f'Суп {number}', text='Суп',
+                cooking_time=10, image=TEST_IMAGE
+            )
+            for number in range(count)
+        )
+
+    def test_filters_apply_to_every_match(self):
+        self.make_soups(600)
+        other = make_author(2)
+        weakest = make_recipe(other, (), (), name='Окрошка')
+        Recipe.objects.filter(pk=weakest.pk).update(text='Почти суп')
+
+        self.assertEqual(
+            self.search_ids(f'?search=суп&author={other.pk}'), [weakest.pk]
+        )
+        response = self.client.get(RECIPES + '?search=суп&limit=1')
+        self.assertEqual(response.json()['count'], 601)
+
+    def test_page_query_carries_only_page_ids(self):
+        self.make_soups(600)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(RECIPES + '?search=суп&limit=6&page=3')
+        data = response.json()
+        self.assertEqual(data['count'], 600)
+        self.assertEqual(len(data['results']), 6)
+        self.assertLess(
+            max(len(query['sql']) for query in context.captured_queries),
+            2000
+        )
+
+    def test_wide_filters_are_checked_in_chunks(self):
+        self.make_soups(300)
+        with mock.patch.multiple(
+            'recipes.search', RANKED_FILTERED_LIMIT=10, RANKED_CHUNK=50,
+            RANKED_MAX_RESULTS=120
+        ):
+            response = self.client.get(
+                RECIPES + f'?search=суп&author={self.author.pk}&limit=6'
+            )
+        data = response.json()
+        self.assertEqual(data['count'], 120)
+        self.assertEqual(len(data['results']), 6)
+
+    def test_cursor_pagination_rejects_ranked_search(self):
+        make_recipe(self.author, (), (), name='Суп')
+        response = self.client.get(
+            RECIPES + '?search=суп&pagination=cursor'
+        )
+        self.assertEqual(response.status_code, 406)
+
+
+class IngredientIndexTests(TestCase):
+
+    def setUp(self):
+        ingredient_index.invalidate()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('Соль', 'Сахар', 'Молоко')
+        )
+
+    def test_warm_lookups_do_not_query_database(self):
+        self.assertEqual(
+            [ingredient.name for ingredient in ingredient_index.search('с')],
+            ['Сахар', 'Соль']
+        )
+        with self.assertNumQueries(0):
+            ingredient_index.search('са')
+            ingredient_index.fuzzy_search('малоко')
+
+    def test_catalog_change_rebuilds_index(self):
+        ingredient_index.search('с')
+        Ingredient.objects.create(name='Сметана', measurement_unit='г')
+        self.assertEqual(len(ingredient_index.search('с')), 3)
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class IngredientMatchTests(TestCase):
+
+    def setUp(self):
+        ingredient_recipe_index.invalidate()
+        self.client = APIClient()
+        self.author = make_author(1)
+        self.salt, self.egg, self.milk = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('соль', 'яйцо', 'молоко')
+        )
+
+    def match_ids(self, query):
+        response = self.client.get(RECIPES + query + '&limit=10')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_more_matches_and_shorter_recipes_come_first(self):
+        salt, egg, milk = self.salt, self.egg, self.milk
+        omelette = make_recipe(self.author, (egg, milk, salt), ())
+        boiled_egg = make_recipe(self.author, (egg, salt), ())
+        pancakes = make_recipe(self.author, (egg, milk, salt), ())
+        make_recipe(self.author, (milk,), ())
+
+        self.assertEqual(
+            self.match_ids(f'?ingredients={salt.pk},{egg.pk}&match=all'),
+            [boiled_egg.pk, pancakes.pk, omelette.pk]
+        )
+        self.assertEqual(
+            self.match_ids(f'?ingredients={egg.pk},{milk.pk}&match=any')[:2],
+            [pancakes.pk, omelette.pk]
+        )
+
+    def test_filters_apply_to_every_match(self):
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=self.author, name=f'Яичница {number}', text='Яйца',
+                cooking_time=10, image=TEST_IMAGE
+            )
+            for number in range(600)
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=self.egg, amount=1)
+            for recipe in recipes
+        )
+        other = make_author(2)
+        weakest = make_recipe(other, (self.egg, self.milk, self.salt), ())
+
+        self.assertEqual(
+            self.match_ids(f'?ingredients={self.egg.pk}&author={other.pk}'),
+            [weakest.pk]
+        )
+
+    def test_page_query_carries_only_page_ids(self):
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=self.author, name=f'Яичница {number}', text='Яйца',
+                cooking_time=10, image=TEST_IMAGE
+            )
+            for number in range(600)
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=self.egg, amount=1)
+            for recipe in recipes
+        )
+        with CaptureQueriesContext(connection) as context:
+            data = self.client.get(
+                RECIPES + f'?ingredients={self.egg.pk}&limit=6&page=2'
+            ).json()
+        self.assertEqual(data['count'], 600)
+        self.assertEqual(
+            [recipe['id'] for recipe in data['results']],
+            [recipe.pk for recipe in reversed(recipes)][6:12]
+        )
+        self.assertLess(
+            max(len(query['sql']) for query in context.captured_queries),
+            2000
+        )
+
+    def test_rewritten_compositions_are_compacted(self):
+        recipe = make_recipe(self.author, (self.salt,), ())
+        ingredient_recipe_index.search((self.salt.pk,))
+        for _ in range(50):
+            ingredient_recipe_index.update(recipe.pk, (self.egg.pk,))
+            ingredient_recipe_index.update(
+                recipe.pk, (self.salt.pk, self.milk.pk)
+            )
+        self.assertLessEqual(len(ingredient_recipe_index._flat), 4)
+        # перед поиском индекс перечитывает из базы исходный состав
+        self.assertEqual(
+            ingredient_recipe_index.search((self.salt.pk,)), [(recipe.pk, 1)]
+        )
+        self.assertEqual(ingredient_recipe_index.search((self.milk.pk,)), [])
@@ -0,0 +1,58 @@
+"""Фильтр рецептов по тегам."""
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from recipes.models import Tag
+from rest_framework.test import APIClient
+
+from .utils import make_author, make_recipe
+
+RECIPES = '/api/recipes/'
+
+
+def make_tag(number):
+    return Tag.objects.create(
+        name=f'Тег {number}', color=f'#{number:06X}', slug=f'tag{number}'
+    )
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class TagFilterTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.lunch, self.dinner, self.soup = (make_tag(n) for n in (1, 2, 3))
+        self.author = make_author(1)
+
+    def test_recipe_with_several_tags_is_listed_once(self):
+        both = make_recipe(self.author, (), (self.lunch, self.dinner))
+        only_lunch = make_recipe(self.author, (), (self.lunch,))
+        make_recipe(self.author, (), (self.soup,))
+
+        data = self.client.get(
+            RECIPES + '?tags=tag1&tags=tag2&limit=10'
+        ).json()
+        self.assertEqual(
+            [recipe['id'] for recipe in data['results']],
+            [only_lunch.pk, both.pk]
+        )
+        self.assertEqual(data['count'], 2)
+
+    def test_unknown_tag_is_not_acceptable(self):
+        response = self.client.get(RECIPES + '?tags=tag1&tags=missing')
+        self.assertEqual(response.status_code, 406)
+
+    def test_new_tag_is_found_without_restart(self):
+        self.client.get(RECIPES + '?tags=tag1')
+        recipe = make_recipe(self.author, (), (make_tag(4),))
+        data = self.client.get(RECIPES + '?tags=tag4&limit=10').json()
+        self.assertEqual(
+            [found['id'] for found in data['results']], [recipe.pk]
+        )
+
+    def test_deleting_tag_touches_its_recipes(self):
+        recipe = make_recipe(self.author, (), (self.lunch,))
+        before = timezone.now()
+        self.lunch.delete()
+        recipe.refresh_from_db()
+        self.assertGreaterEqual(recipe.updated_at, before)
+        self.assertFalse(recipe.tags.exists())
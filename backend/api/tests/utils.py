@@ -0,0 +1,98 @@
+import shutil
+import tempfile
+from contextlib import contextmanager
+from io import BytesIO
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from recipes.models import Recipe, RecipeIngredient, RecipeTag
+from users.models import User
+
+TEST_IMAGE = 'recipes/images/test.png'
+
+
+def png_bytes(size=(10, 10)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class TemporaryMediaMixin:
+    """Файлы, которые пишут тесты, попадают во временный MEDIA_ROOT."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+
+class QueryBudgetMixin:
+    """Проверки числа SQL-запросов для TestCase.
+
+    assertQueryBudget — не больше заданного числа запросов,
+    assertQueriesDoNotScale — одинаковое число запросов при разном
+    объёме данных.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, budget, using=DEFAULT_DB_ALIAS):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context)
+        if executed > budget:
+            queries = '\n'.join(
+                f'{number}. {query["sql"]}'
+                for number, query in enumerate(context.captured_queries, 1)
+            )
+            self.fail(
+                f'{executed} запросов при бюджете {budget}:\n{queries}'
+            )
+
+    def assertQueriesDoNotScale(self, small, large, message=None):
+        """small и large — контексты запросов при малом и большом объёме."""
+        if len(large) > len(small):
+            queries = '\n'.join(
+                query['sql'] for query in large.captured_queries
+            )
+            self.fail(message or (
+                f'Число запросов растёт с объёмом данных: '
+                f'{len(small)} -> {len(large)}:\n{queries}'
+            ))
+
+
+def make_author(number):
+    return User.objects.create_user(
+        username=f'author{number}',
+        email=f'author{number}@example.com',
+        first_name='Автор',
+        last_name=str(number),
+        password='Secret-password-1'
+    )
+
+
+def make_recipe(author, ingredients, tags, name='Рецепт'):
+    recipe = Recipe.objects.create(
+        author=author,
+        name=name,
+        text='Описание',
+        cooking_time=10,
+        image=TEST_IMAGE
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=5)
+        for ingredient in ingredients
+    )
+    RecipeTag.objects.bulk_create(
+        RecipeTag(recipe=recipe, tag=tag) for tag in tags
+    )
+    return recipe
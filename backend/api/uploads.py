@@ -0,0 +1,81 @@
+"""Загрузка изображений потоком во временный файл с ограничением размера."""
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadhandler import (FileUploadHandler,
+                                             TemporaryFileUploadHandler)
+from PIL import Image, UnidentifiedImageError
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.parsers import FileUploadParser
+
+IMAGE_MAX_SIZE = getattr(settings, 'RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+ALLOWED_FORMATS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+
+
+class ImageTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Размер изображения превышает допустимый.'
+    default_code = 'image_too_large'
+
+
+class SizeLimitUploadHandler(FileUploadHandler):
+    """Прерывает загрузку, как только файл превышает max_size."""
+
+    # запас на заголовки и границы multipart
+    overhead = 64 * 1024
+
+    def __init__(self, request=None, max_size=IMAGE_MAX_SIZE):
+        super().__init__(request)
+        self.max_size = max_size
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        if content_length and content_length > self.max_size + self.overhead:
+            raise ImageTooLarge()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            raise ImageTooLarge()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def get_upload_handlers(request, max_size=IMAGE_MAX_SIZE):
+    return [
+        SizeLimitUploadHandler(request, max_size),
+        TemporaryFileUploadHandler(request),
+    ]
+
+
+class RawImageParser(FileUploadParser):
+    """Тело запроса целиком является изображением."""
+    media_type = 'image/*'
+
+    def get_filename(self, stream, media_type, parser_context):
+        return super().get_filename(
+            stream, media_type, parser_context
+        ) or 'upload'
+
+
+def validate_image(upload):
+    """Проверяет только заголовок файла и возвращает имя для хранилища."""
+    try:
+        with Image.open(upload) as image:
+            image_format = image.format
+    except (UnidentifiedImageError, OSError):
+        raise ValidationError({'image': 'Файл не является изображением.'})
+    finally:
+        upload.seek(0)
+    if image_format not in ALLOWED_FORMATS:
+        raise ValidationError(
+            {'image': f'Формат {image_format} не поддерживается.'}
+        )
+    return f'{uuid.uuid4()}.{ALLOWED_FORMATS[image_format]}'
@@ -1,34 +1,70 @@
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch,
+                              Subquery, Sum, Value)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from recipes.models import Cart, Favorite, Follow, Ingredient, Recipe, Tag
-from rest_framework import permissions, status, viewsets
+from recipes.feed import Feed
+from recipes.images import derivatives_ready
+from recipes.models import (Cart, Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, Tag, UploadedImage)
+from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from users.models import User
 
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import PageNumberLimitPagination, SubscriptionsPagination
+from .mixins import CatalogCacheMixin, ConditionalGetMixin
+from .pagination import (KeysetPagination, PageNumberLimitPagination,
+                         SubscriptionsPagination)
 from .permissions import IsAuthorOrReadonly
-from .renrerers import CSVCartRenderer
+from .renrerers import stream_cart_csv
 from .serializers import (CustomUserSerializer, FavoriteRecipeSerializer,
                           FollowUserSerializer, IngredientSerializer,
-                          RecipeSerializer, TagSerializer)
+                          RecipeSerializer, TagSerializer,
+                          UploadedImageSerializer)
+from .uploads import RawImageParser, get_upload_handlers, validate_image
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
     filter_backends = (IngredientFilter,)
     search_fields = ('^name',)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class UploadedImageViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
+    serializer_class = UploadedImageSerializer
+    queryset = UploadedImage.objects.all()
+    permission_classes = (permissions.IsAuthenticated,)
+    parser_classes = (MultiPartParser, RawImageParser)
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = get_upload_handlers(request)
+        return super().initialize_request(request, *args, **kwargs)
+
+    def create(self, request, *args, **kwargs):
+        upload = request.data.get('image') or request.data.get('file')
+        if upload is None:
+            return Response(
+                {'image': 'Передайте файл изображения.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        upload.name = validate_image(upload)
+        instance = UploadedImage.objects.create(
+            owner=request.user, image=upload
+        )
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = RecipeSerializer
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadonly,)
@@ -36,17 +72,64 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if (
+                self.action in ('list', 'feed')
+                and KeysetPagination.is_requested(self.request)
+            ):
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        user = self.request.user
+        authors = User.objects.all()
+        queryset = Recipe.objects.prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredients_lst',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+        if user.is_authenticated:
+            authors = authors.annotate(subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+            queryset = queryset.annotate(
+                is_favorited=Exists(
+                    Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+                ),
+                is_in_shopping_cart=Exists(
+                    Cart.objects.filter(user=user, recipe=OuterRef('pk'))
+                )
+            )
+        return queryset.prefetch_related(Prefetch('author', queryset=authors))
+
+    def get_etag_parts(self, recipe):
+        author = recipe.author
+        return (
+            recipe.pk,
+            recipe.updated_at.isoformat(),
+            derivatives_ready(recipe.image),
+            getattr(recipe, 'is_favorited', False),
+            getattr(recipe, 'is_in_shopping_cart', False),
+            author.pk,
+            author.email,
+            author.username,
+            author.first_name,
+            author.last_name,
+            getattr(author, 'subscribed', False)
+        )
+
+    def get_last_modified(self, recipe):
+        return recipe.updated_at
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-    def get_renderers(self):
-        if (
-            self.action == 'download_shopping_cart'
-            and self.request.user.is_authenticated
-        ):
-            return (CSVCartRenderer(),)
-        return super().get_renderers()
-
     def post_del_base(self, request, model, post_error_msg, delete_error_msg):
         recipe = self.get_object()
         if request.method == 'POST':
@@ -104,6 +187,21 @@ class RecipeViewSet(viewsets.ModelViewSet):
             'Рецепт отсутствует в корзине.'
         )
 
+    @action(
+        methods=('get',),
+        detail=False,
+        url_path='feed',
+        permission_classes=(permissions.IsAuthenticated,)
+    )
+    def feed(self, request):
+        feed = Feed(request.user, self.get_queryset())
+        page = self.paginate_queryset(feed)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(feed[:feed.count()], many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     @action(
         methods=('get',),
         detail=False,
@@ -111,30 +209,15 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=(permissions.IsAuthenticated,),
     )
     def download_shopping_cart(self, request):
-        instance = request.user.cart.all()
-        cart_dct = {}
-        for obj in instance:
-            for ingredient_amount in obj.recipe.ingredients_lst.all():
-                ingredient = ingredient_amount.ingredient.name
-                if ingredient in cart_dct:
-                    cart_dct[ingredient][0] += ingredient_amount.amount
-                else:
-                    cart_dct[ingredient] = [
-                        ingredient_amount.amount,
-                        ingredient_amount.ingredient.measurement_unit
-                    ]
-        result = [
-            {
-                'Ингредиент': ingredient,
-                'Мера измерения': cart_dct[ingredient][1],
-                'Количество': cart_dct[ingredient][0]
-            }
-            for ingredient in cart_dct
-        ]
-        return Response(
-            result,
+        ingredients = RecipeIngredient.objects.filter(
+            recipe__cart__user=request.user
+        ).values(
+            'ingredient__name', 'ingredient__measurement_unit'
+        ).annotate(amount=Sum('amount')).order_by('ingredient__name')
+        return StreamingHttpResponse(
+            stream_cart_csv(ingredients),
             headers={'Content-Disposition': 'attachment; filename=cart.csv'},
-            content_type='text/csv',
+            content_type='text/csv; charset=utf-8',
             status=status.HTTP_200_OK
         )
 
@@ -148,6 +231,28 @@ class CustomUserViewSet(UserViewSet):
             return CustomUserSerializer
         return super().get_serializer_class()
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_authenticated and self.action in ('list', 'retrieve'):
+            queryset = queryset.annotate(subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+        return queryset
+
+    @staticmethod
+    def get_authors_with_recipes(queryset, recipes_limit=None):
+        recipes = Recipe.objects.all()
+        if recipes_limit is not None:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).order_by('-pub_date').values('pk')[:recipes_limit]
+            ))
+        return queryset.annotate(
+            subscribed=Value(True, output_field=BooleanField())
+        ).prefetch_related(Prefetch('recipes', queryset=recipes))
+
     @action(
         methods=('post', 'delete'),
         detail=True,
@@ -194,8 +299,22 @@ class CustomUserViewSet(UserViewSet):
         pagination_class=SubscriptionsPagination
     )
     def get_subscriptions(self, request):
-        queryset = User.objects.select_related().filter(
-            follower__user=request.user
+        recipes_limit = request.query_params.get(
+            self.paginator.recipes_limit_query
+        )
+        if recipes_limit:
+            try:
+                recipes_limit = max(int(recipes_limit), 0)
+            except ValueError:
+                return Response(
+                    {'error: ': 'recipes_limit должно быть целым числом.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            recipes_limit = None
+        queryset = self.get_authors_with_recipes(
+            User.objects.filter(follower__user=request.user),
+            recipes_limit
         )
         page = self.paginate_queryset(queryset)
         if page is not None:
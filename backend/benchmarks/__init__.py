@@ -0,0 +1,27 @@
+import os
+from contextlib import contextmanager
+
+import django
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    django.setup()
+
+
+@contextmanager
+def throwaway_database():
+    """Временная тестовая база вместо настроенной, как у manage.py test.
+
+    Бенчмарки, которые сами заполняют базу, работают в ней, чтобы не
+    оставлять данные в рабочей базе.
+    """
+    from django.test.utils import setup_databases, teardown_databases
+
+    config = setup_databases(
+        verbosity=0, interactive=False, serialized_aliases=set()
+    )
+    try:
+        yield
+    finally:
+        teardown_databases(config, verbosity=0)
@@ -0,0 +1,302 @@
+"""Нагрузочный прогон основных эндпоинтов API.
+
+Запуск из каталога backend (база берётся из настроек, DB_* в окружении):
+    python -m benchmarks.api --concurrency 8 --requests 200 \\
+        --output results.json --compare previous.json
+
+По умолчанию запросы выполняются в процессе через django.test.Client
+во временной тестовой базе, что позволяет считать запросы к базе.
+С --base-url запросы идут по HTTP к запущенному серверу, число запросов
+к базе тогда не измеряется, а данные создаются в настроенной базе:
+рецепты, добавленные сценарием recipe_create, после прогона удаляются.
+"""
+import argparse
+import base64
+import io
+import json
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from benchmarks import setup, throwaway_database
+from benchmarks.stats import summarize
+
+
+def make_image():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'orange').save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+def build_scenarios(reader, rnd):
+    from recipes.models import Ingredient, Recipe, Tag
+
+    recipe_ids = list(Recipe.objects.values_list('pk', flat=True)[:1000])
+    own_recipe = Recipe.objects.filter(author=reader).first()
+    author_ids = list(
+        Recipe.objects.values_list('author_id', flat=True).distinct()[:50]
+    )
+    slugs = list(Tag.objects.values_list('slug', flat=True))
+    names = list(Ingredient.objects.values_list('name', flat=True)[:500])
+    ingredient_ids = list(
+        Ingredient.objects.values_list('pk', flat=True)[:500]
+    )
+    image = make_image()
+    last_page = max(Recipe.objects.count() // 6, 1)
+
+    def recipe_payload():
+        return {
+            'name': 'Бенчмарк',
+            'text': 'Рецепт, созданный нагрузочным тестом.',
+            'cooking_time': rnd.randint(5, 60),
+            'image': image,
+            'tags': [Tag.objects.values_list('pk', flat=True)[0]],
+            'ingredients': [
+                {'id': pk, 'amount': rnd.randint(1, 100)}
+                for pk in rnd.sample(ingredient_ids, 10)
+            ],
+        }
+
+    scenarios = {
+        'recipes_list': lambda: ('GET', '/api/recipes/?page=1&limit=6'),
+        'recipes_list_tags': lambda: (
+            'GET',
+            '/api/recipes/?page=1&limit=6&tags='
+            + '&tags='.join(rnd.sample(slugs, min(2, len(slugs))))
+        ),
+        'recipes_list_author': lambda: (
+            'GET',
+            f'/api/recipes/?page=1&limit=6&author={rnd.choice(author_ids)}'
+        ),
+        'recipes_list_favorited': lambda: (
+            'GET', '/api/recipes/?page=1&limit=6&is_favorited=1'
+        ),
+        'recipes_list_cart': lambda: (
+            'GET', '/api/recipes/?page=1&limit=6&is_in_shopping_cart=1'
+        ),
+        'recipes_list_deep_page': lambda: (
+            'GET',
+            f'/api/recipes/?page={rnd.randint(last_page // 2, last_page)}'
+            '&limit=6'
+        ),
+        'recipe_detail': lambda: (
+            'GET', f'/api/recipes/{rnd.choice(recipe_ids)}/'
+        ),
+        'subscriptions': lambda: (
+            'GET', '/api/users/subscriptions/?page=1&limit=6&recipes_limit=3'
+        ),
+        'download_shopping_cart': lambda: (
+            'GET', '/api/recipes/download_shopping_cart/'
+        ),
+        'ingredient_autocomplete': lambda: (
+            'GET', f'/api/ingredients/?name={rnd.choice(names)[:3]}'
+        ),
+        'recipe_create': lambda: ('POST', '/api/recipes/', recipe_payload()),
+    }
+    if own_recipe is not None:
+        scenarios['recipe_update'] = lambda: (
+            'PATCH', f'/api/recipes/{own_recipe.pk}/', recipe_payload()
+        )
+    return scenarios
+
+
+class InProcessTransport:
+    """Выполняет запросы через django.test.Client и считает запросы к базе."""
+
+    def __init__(self, token):
+        self.token = token
+        self.local = threading.local()
+
+    def __call__(self, method, path, payload=None):
+        from django.db import connection
+        from django.test import Client
+
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client(
+                raise_request_exception=False,
+                HTTP_AUTHORIZATION=f'Token {self.token}'
+            )
+        queries = [0]
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        data = json.dumps(payload) if payload is not None else None
+        with connection.execute_wrapper(count):
+            response = client.generic(
+                method, path, data or '', content_type='application/json'
+            )
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return response.status_code, queries[0]
+
+
+class HttpTransport:
+    def __init__(self, base_url, token):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+
+    def __call__(self, method, path, payload=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=data,
+            method=method,
+            headers={
+                'Authorization': f'Token {self.token}',
+                'Content-Type': 'application/json',
+            }
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status, None
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+def run_scenario(transport, make_request, requests, concurrency):
+    timings, queries, errors = [], [], 0
+    lock = threading.Lock()
+
+    def call(_):
+        nonlocal errors
+        request = make_request()
+        start = time.perf_counter()
+        try:
+            status, count = transport(*request)
+        except Exception:
+            # обрыв соединения или таймаут считается ошибкой, а не
+            # останавливает прогон
+            status, count = None, None
+        elapsed = time.perf_counter() - start
+        with lock:
+            timings.append(elapsed)
+            if count is not None:
+                queries.append(count)
+            if status is None or status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(call, range(requests)))
+    wall = time.perf_counter() - started
+    result = summarize(timings)
+    result.update({
+        'throughput_rps': round(requests / wall, 2) if wall else 0.0,
+        'errors': errors,
+        'queries_per_request': (
+            round(sum(queries) / len(queries), 2) if queries else None
+        ),
+        'max_queries': max(queries) if queries else None,
+    })
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous):
+    lines = []
+    for name, result in current['scenarios'].items():
+        before = previous.get('scenarios', {}).get(name)
+        if not before or not before.get('p95_ms'):
+            continue
+        ratio = result['p95_ms'] / before['p95_ms']
+        flag = '  <-- регрессия' if ratio > 1.2 else ''
+        lines.append(
+            f'{name:28} p95 {before["p95_ms"]:9.2f} -> '
+            f'{result["p95_ms"]:9.2f} мс (x{ratio:.2f}){flag}'
+        )
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=100,
+                        help='Запросов на сценарий')
+    parser.add_argument('--scenario', action='append',
+                        help='Запустить только указанные сценарии')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--recipes', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--base-url',
+                        help='Гонять запросы по HTTP к этому серверу')
+    parser.add_argument('--output', help='Сохранить результаты в JSON')
+    parser.add_argument('--compare', help='Сравнить с сохранённым JSON')
+    args = parser.parse_args()
+
+    setup()
+    if args.base_url:
+        run(args)
+    else:
+        with throwaway_database():
+            run(args)
+
+
+def run(args):
+    from benchmarks.data import ensure_dataset
+    from recipes.models import Recipe
+
+    reader, token = ensure_dataset(args.users, args.recipes, seed=args.seed)
+    rnd = random.Random(args.seed)
+    scenarios = build_scenarios(reader, rnd)
+    if args.scenario:
+        scenarios = {
+            name: scenarios[name] for name in args.scenario
+            if name in scenarios
+        }
+    transport = (
+        HttpTransport(args.base_url, token) if args.base_url
+        else InProcessTransport(token)
+    )
+    results = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'revision': git_revision(),
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        'recipes': Recipe.objects.count(),
+        'scenarios': {},
+    }
+    last_pk = Recipe.objects.order_by('-pk').values_list(
+        'pk', flat=True
+    ).first() or 0
+    try:
+        for name, make_request in scenarios.items():
+            results['scenarios'][name] = run_scenario(
+                transport, make_request, args.requests, args.concurrency
+            )
+            print(name, json.dumps(results['scenarios'][name]))
+    finally:
+        # рецепты из recipe_create не должны копиться от прогона к прогону
+        Recipe.objects.filter(author=reader, pk__gt=last_pk).delete()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            print(compare(results, json.load(file)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Набор данных для бенчмарков: пользователи bench_*, их рецепты и связи.
+
+ensure_dataset дополняет текущую базу: при прогоне в процессе это временная
+тестовая база, при прогоне по HTTP — база запущенного сервера.
+"""
+import random
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import transaction
+from recipes.models import (Cart, Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, RecipeTag, Tag)
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+PREFIX = 'bench_'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+BENCH_IMAGE = 'recipes/images/bench.png'
+
+
+@transaction.atomic
+def ensure_dataset(users=50, recipes=2000, catalog='../data/ingredients.csv',
+                   seed=42):
+    """Создаёт недостающие данные и возвращает (пользователь, токен)."""
+    rnd = random.Random(seed)
+    if not Ingredient.objects.exists():
+        call_command('add_ingredients', catalog, stdout=StringIO())
+    for name, color, slug in TAGS:
+        Tag.objects.get_or_create(
+            slug=slug, defaults={'name': name, 'color': color}
+        )
+    existing = User.objects.filter(username__startswith=PREFIX).count()
+    User.objects.bulk_create(
+        User(
+            username=f'{PREFIX}{number}',
+            email=f'{PREFIX}{number}@example.com',
+            first_name='Bench',
+            last_name=str(number),
+        )
+        for number in range(existing, users)
+    )
+    authors = list(
+        User.objects.filter(username__startswith=PREFIX).order_by('pk')
+    )
+    missing = recipes - Recipe.objects.filter(author__in=authors).count()
+    if missing > 0:
+        create_recipes(authors, missing, rnd)
+        call_command('rebuild_counters', stdout=StringIO())
+    reader = authors[0]
+    Follow.objects.bulk_create(
+        (Follow(user=reader, author=author) for author in authors[1:21]),
+        ignore_conflicts=True
+    )
+    if not reader.favorite_recipes.exists():
+        sample = Recipe.objects.filter(
+            author__in=authors
+        ).values_list('pk', flat=True)[:200]
+        Favorite.objects.bulk_create(
+            Favorite(user=reader, recipe_id=pk) for pk in sample
+        )
+        Cart.objects.bulk_create(
+            Cart(user=reader, recipe_id=pk) for pk in sample[:30]
+        )
+    token, _ = Token.objects.get_or_create(user=reader)
+    return reader, token.key
+
+
+def create_recipes(authors, count, rnd, batch_size=1000):
+    ingredients = list(Ingredient.objects.values_list('pk', flat=True))
+    tags = list(Tag.objects.values_list('pk', flat=True))
+    for start in range(0, count, batch_size):
+        chosen_tags = [
+            rnd.sample(tags, rnd.randint(1, len(tags)))
+            for _ in range(min(batch_size, count - start))
+        ]
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=rnd.choice(authors),
+                name=f'Рецепт {start + number}',
+                text='Описание рецепта для нагрузочного теста.',
+                cooking_time=rnd.randint(5, 120),
+                image=BENCH_IMAGE,
+            )
+            for number, chosen in enumerate(chosen_tags)
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient_id=pk,
+                             amount=rnd.randint(1, 500))
+            for recipe in recipes
+            for pk in rnd.sample(ingredients, rnd.randint(3, 12))
+        )
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=pk)
+            for recipe, chosen in zip(recipes, chosen_tags)
+            for pk in chosen
+        )
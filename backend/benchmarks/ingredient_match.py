@@ -0,0 +1,115 @@
+"""Поиск рецептов по набору ингредиентов: GROUP BY в базе против индекса.
+
+Использует уже заполненную базу (например, командой seed_data).
+Запуск из каталога backend:
+    python -m benchmarks.ingredient_match --queries 200 --size 5
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks import setup
+from benchmarks.stats import summarize
+
+
+def make_queries(compositions, ingredients, count, size, rnd):
+    """Наборы «что есть в холодильнике»: часть состава случайного рецепта
+    и случайные ингредиенты из каталога."""
+    queries = []
+    for _ in range(count):
+        composition = rnd.choice(compositions)
+        own = rnd.sample(composition, min(len(composition), size // 2 + 1))
+        queries.append(set(own) | set(rnd.sample(ingredients, size)))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--size', type=int, default=5)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    setup()
+    from django.db.models import Count
+    from recipes.models import Ingredient, Recipe, RecipeIngredient
+    from recipes.postings import (MATCH_MODES, ingredient_recipe_index,
+                                  match_ingredients)
+
+    recipes = Recipe.objects.count()
+    if not recipes:
+        raise SystemExit('База пуста, заполните её командой seed_data.')
+    rnd = random.Random(args.seed)
+    sample = rnd.sample(
+        list(Recipe.objects.values_list('pk', flat=True)),
+        min(recipes, 1000)
+    )
+    compositions = {}
+    for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+        recipe_id__in=sample
+    ).values_list('recipe_id', 'ingredient_id'):
+        compositions.setdefault(recipe_id, []).append(ingredient_id)
+    queries = make_queries(
+        list(compositions.values()),
+        list(Ingredient.objects.values_list('pk', flat=True)),
+        args.queries, args.size, rnd
+    )
+
+    def need(ids, match):
+        return {'all': len(ids), 'any': 1, 'most': len(ids) // 2 + 1}[match]
+
+    def sql(ids, match):
+        return list(
+            RecipeIngredient.objects.filter(ingredient__in=ids).values(
+                'recipe'
+            ).annotate(matched=Count('pk')).filter(
+                matched__gte=need(ids, match)
+            ).order_by('-matched', '-recipe').values_list(
+                'recipe', 'matched'
+            )[:args.limit]
+        )
+
+    def index(ids, match):
+        # как и в API, в замер входит итоговый запрос страницы рецептов
+        return [
+            recipe.pk for recipe in match_ingredients(
+                Recipe.objects.all(), ids, match
+            )[:args.limit]
+        ]
+
+    ingredient_recipe_index.invalidate()
+    start = time.perf_counter()
+    ingredient_recipe_index.search((), 'all')
+    index(queries[0], 'all')
+    build_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    report = {
+        'recipes': recipes,
+        'query_size': args.size,
+        'index_build_ms': build_ms,
+    }
+    for match in MATCH_MODES:
+        timings = {'sql': [], 'index': []}
+        agree = 0
+        for ids in queries:
+            results = {}
+            for name, func in (('sql', sql), ('index', index)):
+                begin = time.perf_counter()
+                results[name] = func(ids, match)
+                timings[name].append(time.perf_counter() - begin)
+            counts = dict(ingredient_recipe_index.search(ids, match))
+            agree += [count for _, count in results['sql']] == [
+                counts[pk] for pk in results['index']
+            ]
+        report[match] = {
+            'sql': summarize(timings['sql']),
+            'index': summarize(timings['index']),
+            'same_coverage': round(agree / len(queries), 3),
+        }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
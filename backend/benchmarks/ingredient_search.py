@@ -0,0 +1,123 @@
+"""Сравнение поиска ингредиентов: ILIKE в базе против индекса в памяти.
+
+Каталог загружается во временную тестовую базу, настроенная база не
+меняется.
+
+Запуск из каталога backend:
+    python -m benchmarks.ingredient_search --csv ../data/ingredients.csv
+"""
+import argparse
+import csv
+import json
+import random
+import time
+
+from benchmarks import setup, throwaway_database
+from benchmarks.stats import summarize
+
+
+def read_catalog(path):
+    with open(path, encoding='utf-8') as file:
+        return [
+            (name, measurement_unit)
+            for name, measurement_unit in csv.reader(file)
+            if name and measurement_unit
+        ]
+
+
+def make_typo(name, rnd):
+    name = name.replace('е', 'ё', 1) if rnd.random() < 0.3 else name
+    if len(name) < 4:
+        return name
+    position = rnd.randrange(1, len(name) - 1)
+    kind = rnd.choice(('drop', 'swap', 'double'))
+    if kind == 'drop':
+        return name[:position] + name[position + 1:]
+    if kind == 'swap':
+        return (
+            name[:position - 1] + name[position] + name[position - 1]
+            + name[position + 1:]
+        )
+    return name[:position] + name[position] + name[position:]
+
+
+def timed(func, queries):
+    timings, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(func(query))
+        timings.append(time.perf_counter() - start)
+    return timings, results
+
+
+def recall(names, results):
+    hits = sum(
+        name in {ingredient.name for ingredient in found}
+        for name, found in zip(names, results)
+    )
+    return round(hits / len(names), 3) if names else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--csv', default='../data/ingredients.csv')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    setup()
+    with throwaway_database():
+        run(args)
+
+
+def run(args):
+    from recipes.models import Ingredient
+    from recipes.search import ingredient_index
+
+    catalog = read_catalog(args.csv)
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=name, measurement_unit=unit)
+         for name, unit in catalog],
+        ignore_conflicts=True
+    )
+    rnd = random.Random(args.seed)
+    names = [name for name, _ in rnd.sample(catalog, args.queries)]
+    prefixes = [name[:rnd.randint(1, 5)] for name in names]
+    typos = [make_typo(name, rnd) for name in names]
+
+    def ilike(query):
+        return list(Ingredient.objects.filter(name__istartswith=query))
+
+    def index(query):
+        return (
+            ingredient_index.search(query)
+            or ingredient_index.fuzzy_search(query)
+        )
+
+    ingredient_index.invalidate()
+    start = time.perf_counter()
+    ingredient_index.search('')
+    build_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    ilike_prefix, _ = timed(ilike, prefixes)
+    index_prefix, _ = timed(index, prefixes)
+    ilike_typo, ilike_found = timed(ilike, typos)
+    index_typo, index_found = timed(index, typos)
+    print(json.dumps({
+        'catalog_size': len(catalog),
+        'index_build_ms': build_ms,
+        'prefix': {
+            'ilike': summarize(ilike_prefix),
+            'index': summarize(index_prefix),
+        },
+        'typo': {
+            'ilike': summarize(ilike_typo),
+            'index': summarize(index_typo),
+            'ilike_recall': recall(names, ilike_found),
+            'index_recall': recall(names, index_found),
+        },
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
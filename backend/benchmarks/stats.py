@@ -0,0 +1,21 @@
+import statistics
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = round(percent / 100 * (len(ordered) - 1))
+    return ordered[index]
+
+
+def summarize(timings):
+    """Сводка по списку длительностей в секундах, результат в мс."""
+    return {
+        'count': len(timings),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 3)
+        if timings else 0.0,
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+    }
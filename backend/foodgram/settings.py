@@ -35,6 +35,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'api.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,6 +79,40 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения: DB_REPLICA_HOSTS=replica1,replica2.
+# Остальные параметры подключения берутся у основной базы.
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, map(
+    str.strip, os.getenv('DB_REPLICA_HOSTS', default='').split(',')
+)), start=1):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', default=5))
+
+# С репликами и несколькими процессами нужен общий кеш (Redis, Memcached):
+# в нём хранится метка чтения из основной базы для клиентов с токеном
+# без cookie (api.replicas). LocMemCache у каждого процесса свой.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000
+        }
+    }
+}
+
+# Сколько секунд процесс доверяет запомненной версии справочников
+# (recipes.cache), прежде чем перечитать её из базы.
+CATALOG_VERSION_TTL = float(os.getenv('CATALOG_VERSION_TTL', default=1))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -133,3 +169,8 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'backend_static')
 
 MEDIA_URL = '/backend_media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'backend_media')
+
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
+
+METRICS_DIR = os.getenv('METRICS_DIR', default='/tmp/foodgram_metrics')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
@@ -24,32 +24,55 @@ class RecipeTagAdmin(admin.TabularInline):
     verbose_name = 'тег'
 
 
+def edited_recipe_ids(formset):
+    """id рецептов, строки которых добавили, изменили или удалили."""
+    objects = [
+        *formset.new_objects,
+        *(obj for obj, _ in formset.changed_objects),
+        *formset.deleted_objects
+    ]
+    recipe_ids = {obj.recipe_id for obj in objects}
+    recipe_ids.update(
+        inline_form.initial['recipe'] for inline_form in formset.initial_forms
+        if 'recipe' in inline_form.changed_data
+    )
+    return recipe_ids
+
+
+class TouchRecipesMixin:
+    """Отмечает изменёнными рецепты, которые правили во вложенных формах.
+
+    Сохранение строк RecipeIngredient и RecipeTag рецепт не трогает,
+    поэтому его updated_at обновляется одним UPDATE после сохранения формы.
+    """
+
+    def save_formset(self, request, form, formset, change):
+        super().save_formset(request, form, formset, change)
+        Recipe.objects.filter(pk__in=edited_recipe_ids(formset)).touch()
+
+
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeIngredientAdmin, RecipeTagAdmin)
     list_display = (
         'name',
-        'author'
+        'author',
+        'favorites_count'
     )
     list_display_links = ('name',)
     list_filter = ('author', 'name', 'tags')
     search_fields = ('name',)
-    readonly_fields = ('get_favorite_count',)
-
-    def get_favorite_count(self, obj):
-        return obj.follower.count()
-
-    get_favorite_count.short_description = 'в избранном'
+    readonly_fields = ('favorites_count', 'in_carts_count')
 
 
 @admin.register(Tag)
-class TagAdmin(admin.ModelAdmin):
+class TagAdmin(TouchRecipesMixin, admin.ModelAdmin):
     inlines = (RecipeTagAdmin, )
     list_display = ('name',)
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(TouchRecipesMixin, admin.ModelAdmin):
     inlines = (RecipeIngredientAdmin,)
     list_display = (
         'name',
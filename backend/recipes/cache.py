@@ -0,0 +1,65 @@
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from recipes.models import CatalogVersion
+
+CATALOG_VERSION_PK = 1
+
+_remembered = None
+
+
+def get_version_ttl():
+    return getattr(settings, 'CATALOG_VERSION_TTL', 1)
+
+
+def read_catalog_version():
+    """Версия справочников из основной базы: реплика может отставать
+    от уже изменённого каталога."""
+    versions = CatalogVersion.objects.using(DEFAULT_DB_ALIAS)
+    version = versions.filter(pk=CATALOG_VERSION_PK).values_list(
+        'version', flat=True
+    ).first()
+    if version is None:
+        version = versions.get_or_create(
+            pk=CATALOG_VERSION_PK, defaults={'version': time.time_ns()}
+        )[0].version
+    return version
+
+
+def get_catalog_version():
+    """Текущая версия справочников тегов и ингредиентов.
+
+    Версия — время последнего изменения в наносекундах. Процесс помнит
+    её CATALOG_VERSION_TTL секунд, поэтому тёплые чтения не ходят
+    в базу: изменения из других процессов видны с этой задержкой,
+    изменения своего процесса — сразу.
+    """
+    global _remembered
+    now = time.monotonic()
+    if _remembered is not None and _remembered[1] > now:
+        return _remembered[0]
+    version = read_catalog_version()
+    _remembered = (version, now + get_version_ttl())
+    return version
+
+
+def forget_catalog_version():
+    global _remembered
+    _remembered = None
+
+
+def bump_catalog_version():
+    updated = CatalogVersion.objects.filter(pk=CATALOG_VERSION_PK).update(
+        version=Greatest(F('version') + 1, Value(time.time_ns()))
+    )
+    if not updated:
+        CatalogVersion.objects.get_or_create(
+            pk=CATALOG_VERSION_PK, defaults={'version': time.time_ns()}
+        )
+    # До коммита новую версию видит только эта транзакция, поэтому
+    # запомненная версия сбрасывается и сейчас, и после коммита.
+    forget_catalog_version()
+    transaction.on_commit(forget_catalog_version)
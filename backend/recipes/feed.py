@@ -0,0 +1,199 @@
+"""Лента рецептов авторов, на которых подписан пользователь.
+
+Новый рецепт сразу раскладывается по лентам подписчиков (fan-out on write).
+Рецепты авторов, у которых больше FEED_FANOUT_LIMIT подписчиков, в ленты
+не копируются и добавляются при чтении (fan-out on read). Лента читается
+не глубже FEED_MAX_LENGTH записей, а лишние записи публикация рецепта
+удаляет из лент подписчиков одним DELETE. Команда trim_feeds дочищает
+ленты, переполненные до этого.
+"""
+import heapq
+from copy import copy
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Q
+from django.db.models.expressions import RawSQL
+from recipes.models import FeedEntry, Follow, Recipe
+
+
+def get_feed_max_length():
+    return getattr(settings, 'FEED_MAX_LENGTH', 500)
+
+
+def get_fanout_limit():
+    return getattr(settings, 'FEED_FANOUT_LIMIT', 10000)
+
+
+def trim_feed(user_id):
+    """Удаляет записи ленты старше FEED_MAX_LENGTH последних."""
+    max_length = get_feed_max_length()
+    boundary = FeedEntry.objects.filter(user_id=user_id).order_by(
+        '-pub_date', '-recipe_id'
+    ).values_list('pub_date', 'recipe_id')[max_length:max_length + 1]
+    if not boundary:
+        return 0
+    pub_date, recipe_id = boundary[0]
+    deleted, _ = FeedEntry.objects.filter(
+        Q(pub_date__lt=pub_date)
+        | Q(pub_date=pub_date, recipe_id__lte=recipe_id),
+        user_id=user_id
+    ).delete()
+    return deleted
+
+
+def overflowing_feeds():
+    """Пользователи, в лентах которых больше FEED_MAX_LENGTH записей."""
+    return FeedEntry.objects.values('user').annotate(
+        entries=Count('pk')
+    ).filter(entries__gt=get_feed_max_length()).values_list(
+        'user', flat=True
+    )
+
+
+def trim_followers_feeds(author_id):
+    """Удаляет записи старше FEED_MAX_LENGTH последних в лентах подписчиков.
+
+    Один DELETE нумерует записи каждой ленты оконной функцией по индексу
+    (user, -pub_date, -recipe), поэтому читает не больше
+    FEED_MAX_LENGTH + 1 записей на подписчика.
+    """
+    quote = connection.ops.quote_name
+    positions = RawSQL(
+        'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+        'PARTITION BY user_id ORDER BY pub_date DESC, recipe_id DESC'
+        ') AS depth FROM {feed} WHERE user_id IN ('
+        'SELECT user_id FROM {follow} WHERE author_id = %s'
+        ')) AS positions WHERE depth > %s'.format(
+            feed=quote(FeedEntry._meta.db_table),
+            follow=quote(Follow._meta.db_table)
+        ),
+        (author_id, get_feed_max_length())
+    )
+    deleted, _ = FeedEntry.objects.filter(pk__in=positions).delete()
+    return deleted
+
+
+def fan_out_recipe(recipe):
+    fanout_limit = get_fanout_limit()
+    followers = list(
+        Follow.objects.filter(
+            author_id=recipe.author_id
+        ).values_list('user_id', flat=True)[:fanout_limit + 1]
+    )
+    if not followers or len(followers) > fanout_limit:
+        return
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe=recipe, pub_date=recipe.pub_date)
+            for user_id in followers
+        ),
+        ignore_conflicts=True
+    )
+    trim_followers_feeds(recipe.author_id)
+
+
+def add_author_to_feed(user_id, author_id):
+    recipes = Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date'
+    ).values_list('pk', 'pub_date')[:get_feed_max_length()]
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe_id=pk, pub_date=pub_date)
+            for pk, pub_date in recipes
+        ),
+        ignore_conflicts=True
+    )
+    trim_feed(user_id)
+
+
+def remove_author_from_feed(user_id, author_id):
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+
+
+def before(cursor, pk_field):
+    pub_date, pk = cursor
+    return Q(pub_date__lt=pub_date) | Q(
+        pub_date=pub_date, **{f'{pk_field}__lt': pk}
+    )
+
+
+def unique(keys):
+    previous = None
+    for key in keys:
+        if key != previous:
+            yield key
+        previous = key
+
+
+class Feed:
+    """Лента пользователя как последовательность рецептов для пагинаторов.
+
+    Срез читает записи FeedEntry диапазоном по индексу
+    (user, -pub_date, -recipe) ровно на глубину среза, сливает их
+    с рецептами знаменитостей в порядке (pub_date, id) и затем загружает
+    рецепты страницы одним запросом по id.
+    """
+
+    def __init__(self, user, recipes):
+        self.user = user
+        self.recipes = recipes
+        self.cursor = None
+        self.celebrities = list(
+            Follow.objects.filter(
+                user=user, author__followers_count__gt=get_fanout_limit()
+            ).values_list('author_id', flat=True)
+        )
+
+    def older_than(self, pub_date, pk):
+        """Та же лента после курсора (pub_date, id)."""
+        feed = copy(self)
+        feed.cursor = (pub_date, pk)
+        return feed
+
+    def get_entry_keys(self, limit):
+        """Ключи записей ленты не глубже FEED_MAX_LENGTH последних."""
+        max_length = get_feed_max_length()
+        entries = FeedEntry.objects.filter(user=self.user).order_by(
+            '-pub_date', '-recipe_id'
+        ).values_list('pub_date', 'recipe_id')
+        if self.cursor is None:
+            return entries[:min(limit, max_length)]
+        oldest = entries[max_length - 1:max_length]
+        entries = entries.filter(before(self.cursor, 'recipe_id'))
+        if oldest:
+            entries = entries.exclude(before(oldest[0], 'recipe_id'))
+        return entries[:limit]
+
+    def get_keys(self, limit):
+        sources = [self.get_entry_keys(limit)]
+        if self.celebrities:
+            recipes = Recipe.objects.filter(author_id__in=self.celebrities)
+            if self.cursor is not None:
+                recipes = recipes.filter(before(self.cursor, 'pk'))
+            sources.append(recipes.order_by('-pub_date', '-pk').values_list(
+                'pub_date', 'pk'
+            )[:limit])
+        return list(islice(
+            unique(heapq.merge(*sources, reverse=True)), limit
+        ))
+
+    def count(self):
+        count = FeedEntry.objects.filter(
+            user=self.user
+        ).order_by()[:get_feed_max_length()].count()
+        if self.celebrities:
+            count += Recipe.objects.filter(
+                author_id__in=self.celebrities
+            ).exclude(feed_entries__user=self.user).count()
+        return count
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        ids = [pk for _, pk in self.get_keys(key.stop)[key.start:]]
+        recipes = self.recipes.in_bulk(ids)
+        return [recipes[pk] for pk in ids if pk in recipes]
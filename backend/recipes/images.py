@@ -0,0 +1,164 @@
+"""Производные изображений рецептов: миниатюры и WebP.
+
+Оригинал по-прежнему хранится в recipes/images/, производные создаются
+в пуле процессов после коммита транзакции и кладутся рядом под
+предсказуемыми именами. Пока производная не готова, вместо неё отдаётся
+оригинал.
+"""
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+DERIVATIVES_DIR = 'recipes/derivatives/'
+THUMBNAIL_SIZES = getattr(settings, 'RECIPE_THUMBNAIL_SIZES', {
+    'thumbnail': (200, 200),
+    'card': (600, 600),
+})
+FORMATS = (('jpg', 'JPEG'), ('webp', 'WEBP'))
+IMAGE_WORKERS = getattr(settings, 'RECIPE_IMAGE_WORKERS', 2)
+READY_CACHE_SIZE = 100000
+# Файлы может удалить другой процесс (collect_media_garbage), поэтому
+# готовность производной перепроверяется не реже раза в READY_TTL секунд.
+READY_TTL = 300
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = Lock()
+_ready = {}
+
+
+def derivative_names(image_name):
+    """Имена производных для файла оригинала: {вариант: {формат: имя}}."""
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    variants = {
+        name: {
+            extension: f'{DERIVATIVES_DIR}{stem}_{name}.{extension}'
+            for extension, _ in FORMATS
+        }
+        for name in THUMBNAIL_SIZES
+    }
+    variants['original'] = {'webp': f'{DERIVATIVES_DIR}{stem}.webp'}
+    return variants
+
+
+def render_derivatives(source, targets):
+    """Создаёт производные; выполняется в отдельном процессе.
+
+    targets: список (путь, размер или None, формат Pillow). Оригинал
+    декодируется, только если какой-то производной ещё нет.
+    """
+    targets = [target for target in targets if not os.path.exists(target[0])]
+    if not targets:
+        return
+    with Image.open(source) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA')
+        for path, size, image_format in targets:
+            image = original
+            if size is not None:
+                image = ImageOps.fit(original, size, Image.LANCZOS)
+            if image_format == 'JPEG' and image.mode != 'RGB':
+                image = image.convert('RGB')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # одну картинку могут одновременно рендерить несколько процессов
+            temporary = f'{path}.{os.getpid()}.tmp'
+            image.save(temporary, image_format, quality=85)
+            os.replace(temporary, path)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        return _executor
+
+
+def get_targets(image_name):
+    variants = derivative_names(image_name)
+    targets = [
+        (default_storage.path(variants[name][extension]), size, pil_format)
+        for name, size in THUMBNAIL_SIZES.items()
+        for extension, pil_format in FORMATS
+    ]
+    targets.append(
+        (default_storage.path(variants['original']['webp']), None, 'WEBP')
+    )
+    return targets
+
+
+def log_failure(image_name):
+    def callback(future):
+        error = future.exception()
+        if error is not None:
+            logger.error(
+                'Не удалось построить производные %s', image_name,
+                exc_info=(type(error), error, error.__traceback__)
+            )
+    return callback
+
+
+def schedule_derivatives(image_name):
+    if not image_name:
+        return None
+    future = get_executor().submit(
+        render_derivatives,
+        default_storage.path(image_name),
+        get_targets(image_name)
+    )
+    future.add_done_callback(log_failure(image_name))
+    return future
+
+
+def is_ready(name):
+    checked_at = _ready.get(name)
+    now = time.monotonic()
+    if checked_at is not None and now - checked_at < READY_TTL:
+        return True
+    if not default_storage.exists(name):
+        _ready.pop(name, None)
+        return False
+    if len(_ready) >= READY_CACHE_SIZE:
+        _ready.clear()
+    _ready[name] = now
+    return True
+
+
+def forget(name):
+    """Сбрасывает готовность файла и производных после удаления."""
+    _ready.pop(name, None)
+    for formats in derivative_names(name).values():
+        for path in formats.values():
+            _ready.pop(path, None)
+
+
+def derivatives_ready(image):
+    """Готовы ли все производные: от этого зависят URL в ответе."""
+    return bool(image) and all(
+        is_ready(path)
+        for formats in derivative_names(image.name).values()
+        for path in formats.values()
+    )
+
+
+def image_variants(image):
+    """URL производных изображения с откатом на оригинал."""
+    if not image:
+        return {}
+    fallback = image.url
+    return {
+        name: {
+            extension: default_storage.url(path) if is_ready(path)
+            else fallback
+            for extension, path in formats.items()
+        }
+        for name, formats in derivative_names(image.name).items()
+    }
@@ -1,28 +1,148 @@
+import csv
 import json
+import os
+import re
+import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.cache import bump_catalog_version
 from recipes.models import Ingredient
 
+DEFAULT_PATH = '../data/ingredients.json'
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_json(file):
+    """Потоково читает JSON-массив объектов, не загружая файл целиком.
+
+    Разбор идёт по индексу в буфере, а прочитанное начало буфера
+    отбрасывается только при чтении следующего куска файла.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE)
+    index = WHITESPACE.match(buffer).end()
+    if not buffer.startswith('[', index):
+        raise CommandError('Ожидается JSON-массив объектов.')
+    index += 1
+    while True:
+        index = WHITESPACE.match(buffer, index).end()
+        if buffer.startswith(',', index):
+            index = WHITESPACE.match(buffer, index + 1).end()
+        if buffer.startswith(']', index):
+            return
+        try:
+            item, index = decoder.raw_decode(buffer, index)
+        except json.JSONDecodeError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Некорректный JSON: массив не завершён.')
+            buffer, index = buffer[index:] + chunk, 0
+            continue
+        yield item.get('name'), item.get('measurement_unit')
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+        else:
+            yield None, None
+
 
 class Command(BaseCommand):
-    help = 'Adds ingredients from json file'
+    help = 'Adds ingredients from json or csv file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=DEFAULT_PATH,
+            help=f'Путь к файлу каталога (по умолчанию {DEFAULT_PATH})'
+        )
+        parser.add_argument(
+            '--format', choices=('json', 'csv'),
+            help='Формат файла, по умолчанию определяется по расширению'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одной пачке вставки'
+        )
+        parser.add_argument(
+            '--update-units', action='store_true',
+            help='Обновлять меру измерения у существующих ингредиентов'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только прочитать файл и посчитать изменения'
+        )
 
     def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            os.path.splitext(path)[1].lstrip('.').lower()
+        )
+        if file_format not in ('json', 'csv'):
+            raise CommandError(
+                'Не удалось определить формат файла, укажите --format.'
+            )
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+        reader = iter_json if file_format == 'json' else iter_csv
+        self.total = self.new = self.skipped = 0
+        start = time.perf_counter()
         try:
-            with open('../data/ingredients.json', 'r') as file:
-                ingredients = json.load(file)
-                count_new = 0
-                for ingredient in ingredients:
-                    name = ingredient.get('name')
-                    measurement_unit = ingredient.get('measurement_unit')
-                    if measurement_unit and name:
-                        new, status = Ingredient.objects.get_or_create(
-                            name=name
-                        )
-                        if status:
-                            new.measurement_unit = measurement_unit
-                            count_new += 1
-                            new.save()
-                print(f'Добавлено ингредиентов: {count_new}')
+            with open(path, 'r', encoding='utf-8') as file:
+                batch = {}
+                for name, measurement_unit in reader(file):
+                    self.total += 1
+                    name = (name or '').strip()
+                    measurement_unit = (measurement_unit or '').strip()
+                    if not name or not measurement_unit:
+                        self.skipped += 1
+                        continue
+                    batch[name] = measurement_unit
+                    if len(batch) >= options['batch_size']:
+                        self.write_batch(batch, options)
+                        batch = {}
+                if batch:
+                    self.write_batch(batch, options)
         except FileNotFoundError as e:
-            print(e)
+            raise CommandError(e)
+        elapsed = time.perf_counter() - start
+        rate = self.total / elapsed if elapsed else self.total
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Прочитано строк: {self.total}, '
+            f'добавлено ингредиентов: {self.new}, '
+            f'пропущено: {self.skipped} '
+            f'({elapsed:.2f} с, {rate:.0f} строк/с)'
+        ))
+
+    def write_batch(self, batch, options):
+        existing = set(
+            Ingredient.objects.filter(
+                name__in=batch
+            ).values_list('name', flat=True)
+        )
+        self.new += len(batch.keys() - existing)
+        if options['dry_run']:
+            return
+        ingredients = [
+            Ingredient(name=name, measurement_unit=measurement_unit)
+            for name, measurement_unit in batch.items()
+        ]
+        with transaction.atomic():
+            if options['update_units']:
+                Ingredient.objects.bulk_create(
+                    ingredients,
+                    update_conflicts=True,
+                    unique_fields=('name',),
+                    update_fields=('measurement_unit',)
+                )
+            else:
+                Ingredient.objects.bulk_create(
+                    ingredients, ignore_conflicts=True
+                )
+            # bulk_create не отправляет сигналы, поэтому версию
+            # справочников меняем сами, вместе с пакетом.
+            bump_catalog_version()
@@ -0,0 +1,26 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from recipes.images import get_targets, render_derivatives
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Builds thumbnails and WebP variants for existing recipe images'
+
+    def handle(self, *args, **options):
+        built = failed = 0
+        images = Recipe.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).iterator()
+        for image_name in images:
+            try:
+                render_derivatives(
+                    default_storage.path(image_name), get_targets(image_name)
+                )
+                built += 1
+            except OSError as e:
+                failed += 1
+                self.stderr.write(f'{image_name}: {e}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {built}, с ошибками: {failed}'
+        ))
@@ -0,0 +1,174 @@
+import os
+import shutil
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from recipes.images import DERIVATIVES_DIR, THUMBNAIL_SIZES, forget
+from recipes.models import MediaFile, Recipe, UploadedImage
+
+IMAGES_DIR = 'recipes/images/'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+def iter_files(root, prefix):
+    """Потоково обходит каталог, не собирая список файлов в памяти."""
+    stack = [os.path.join(root, prefix)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    name = os.path.relpath(entry.path, root)
+                    yield name.replace(os.sep, '/'), entry.stat()
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def original_candidates(derivative):
+    stem = os.path.splitext(os.path.basename(derivative))[0]
+    for variant in THUMBNAIL_SIZES:
+        suffix = f'_{variant}'
+        if stem.endswith(suffix):
+            stem = stem[:-len(suffix)]
+            break
+    return [f'{IMAGES_DIR}{stem}{extension}' for extension in
+            IMAGE_EXTENSIONS]
+
+
+def referenced(names, uploaded_after):
+    """Имена файлов, на которые ссылаются рецепты или свежие загрузки."""
+    found = set(
+        Recipe.objects.filter(image__in=names).values_list('image', flat=True)
+    )
+    found.update(
+        UploadedImage.objects.filter(
+            image__in=names, created__gte=uploaded_after
+        ).values_list('image', flat=True)
+    )
+    return found
+
+
+class Command(BaseCommand):
+    help = 'Deletes or quarantines media files no recipe refers to'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, какие файлы будут удалены'
+        )
+        parser.add_argument(
+            '--quarantine',
+            help='Переносить файлы в этот каталог вместо удаления'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько файлов сверять с базой за один запрос'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Не трогать файлы моложе указанного числа секунд'
+        )
+        parser.add_argument(
+            '--upload-max-age', type=int, default=86400,
+            help='Удалять загрузки, не ставшие рецептом за указанное '
+                 'число секунд'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.root = settings.MEDIA_ROOT
+        self.scanned = self.orphans = self.freed = 0
+        self.uploaded_after = timezone.now() - timedelta(
+            seconds=options['upload_max_age']
+        )
+        expired = self.expire_uploads()
+        threshold = time.time() - options['min_age']
+        for prefix, check in (
+            (IMAGES_DIR, self.check_originals),
+            (DERIVATIVES_DIR, self.check_derivatives),
+        ):
+            files = (
+                (name, stat) for name, stat in iter_files(self.root, prefix)
+                if stat.st_mtime < threshold
+            )
+            for chunk in chunked(files, options['chunk_size']):
+                self.scanned += len(chunk)
+                for name, stat in check(chunk):
+                    self.collect(name, stat.st_size)
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Просроченных загрузок: {expired}, '
+            f'проверено файлов: {self.scanned}, '
+            f'лишних: {self.orphans}, '
+            f'освобождено: {self.freed / 1024 / 1024:.1f} МБ'
+        ))
+
+    def expire_uploads(self):
+        """Удаляет загрузки, которые так и не стали рецептом.
+
+        Удаление строки отпускает ссылку на файл (сигнал post_delete),
+        и файл без других ссылок удаляется сразу; остальное доберёт
+        обход каталогов.
+        """
+        uploads = UploadedImage.objects.filter(
+            created__lt=self.uploaded_after
+        )
+        if self.options['dry_run']:
+            return uploads.count()
+        expired = 0
+        while ids := list(
+            uploads.values_list('pk', flat=True)[:self.options['chunk_size']]
+        ):
+            expired += UploadedImage.objects.filter(pk__in=ids).delete()[0]
+        return expired
+
+    def check_originals(self, chunk):
+        found = referenced([name for name, _ in chunk], self.uploaded_after)
+        return [(name, stat) for name, stat in chunk if name not in found]
+
+    def check_derivatives(self, chunk):
+        candidates = {
+            name: original_candidates(name) for name, _ in chunk
+        }
+        found = referenced([
+            original for originals in candidates.values()
+            for original in originals
+        ], self.uploaded_after)
+        return [
+            (name, stat) for name, stat in chunk
+            if found.isdisjoint(candidates[name])
+        ]
+
+    def collect(self, name, size):
+        self.orphans += 1
+        self.freed += size
+        if self.options['dry_run']:
+            self.stdout.write(name)
+            return
+        path = os.path.join(self.root, name)
+        quarantine = self.options['quarantine']
+        try:
+            if quarantine:
+                target = os.path.join(quarantine, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            # файл уже удалил delete_if_unreferenced или другой сборщик
+            pass
+        forget(name)
+        MediaFile.objects.filter(name=name).delete()
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import Cart, Favorite, Follow, Recipe
+from users.models import User
+
+
+def count_of(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).values(field).annotate(count=Count('pk')).values('count')
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalculates denormalised favorites, carts, recipes and followers '
+        'counters'
+    )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.update(
+            favorites_count=count_of(Favorite, 'recipe'),
+            in_carts_count=count_of(Cart, 'recipe')
+        )
+        users = User.objects.update(
+            recipes_count=count_of(Recipe, 'author'),
+            followers_count=count_of(Follow, 'author')
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны счётчики рецептов: {recipes}, '
+            f'пользователей: {users}'
+        ))
@@ -0,0 +1,260 @@
+import csv
+import random
+import time
+from array import array
+from bisect import bisect_left
+from io import StringIO
+from itertools import accumulate
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from recipes.models import (Cart, Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, RecipeTag, Tag)
+from users.models import User
+
+PREFIX = 'seed_'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+SEED_IMAGE = 'recipes/images/seed.png'
+
+
+class PowerLaw:
+    """Выбор элементов с вероятностью, убывающей как 1 / rank^alpha."""
+
+    def __init__(self, items, alpha, rnd):
+        self.items = array('q', items)
+        ranks = list(range(len(self.items)))
+        rnd.shuffle(ranks)
+        self.cum_weights = list(accumulate(
+            1 / (rank + 1) ** alpha for rank in ranks
+        ))
+        self.total = self.cum_weights[-1] if self.cum_weights else 0
+
+    def sample(self, rnd, k):
+        """k различных элементов (или меньше, если элементов мало)."""
+        k = min(k, len(self.items))
+        chosen = set()
+        attempts = 0
+        while len(chosen) < k and attempts < k * 10:
+            position = bisect_left(self.cum_weights, rnd.random() * self.total)
+            chosen.add(self.items[min(position, len(self.items) - 1)])
+            attempts += 1
+        return chosen
+
+
+class Writer:
+    """Копит объекты и пишет их пачками через COPY или bulk_create."""
+
+    def __init__(self, model, batch_size, use_copy, explicit_pk=False):
+        self.model = model
+        self.batch_size = batch_size
+        self.use_copy = use_copy
+        self.buffer = []
+        self.written = 0
+        self.fields = [
+            field for field in model._meta.concrete_fields
+            if explicit_pk or not field.primary_key
+        ]
+
+    def add(self, obj):
+        self.buffer.append(obj)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.use_copy:
+            self.copy(self.buffer)
+        else:
+            self.model.objects.bulk_create(self.buffer)
+        self.written += len(self.buffer)
+        self.buffer = []
+
+    def copy(self, objects):
+        stream = StringIO()
+        writer = csv.writer(stream)
+        for obj in objects:
+            row = []
+            for field in self.fields:
+                value = field.get_db_prep_save(
+                    field.pre_save(obj, True), connection
+                )
+                row.append('\\N' if value is None else value)
+            writer.writerow(row)
+        stream.seek(0)
+        columns = ', '.join(
+            connection.ops.quote_name(field.column) for field in self.fields
+        )
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {table} ({columns}) FROM STDIN "
+                f"WITH (FORMAT csv, NULL '\\N')",
+                stream
+            )
+
+
+class Command(BaseCommand):
+    help = 'Fills the database with a large deterministic synthetic dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--follows', type=int, default=1000000)
+        parser.add_argument('--favorites', type=int, default=1000000)
+        parser.add_argument('--carts', type=int, default=200000)
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель степенного распределения популярности'
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY даже на PostgreSQL'
+        )
+        parser.add_argument(
+            '--catalog', default='../data/ingredients.csv',
+            help='Каталог ингредиентов, если таблица пуста'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+        if options['users'] < 2:
+            raise CommandError('Нужно минимум два пользователя.')
+        self.options = options
+        self.rnd = random.Random(options['seed'])
+        self.use_copy = (
+            connection.vendor == 'postgresql' and not options['no_copy']
+        )
+        if User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError(
+                f'Пользователи {PREFIX}* уже есть, начните с пустой базы.'
+            )
+        start = time.perf_counter()
+        if not Ingredient.objects.exists():
+            call_command('add_ingredients', options['catalog'],
+                         stdout=StringIO())
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color}
+            )
+        with transaction.atomic():
+            users = self.seed_users()
+            recipes = self.seed_recipes(users)
+            self.seed_relations(
+                Follow, 'author', users, users, options['follows']
+            )
+            self.seed_relations(
+                Favorite, 'recipe', users, recipes, options['favorites']
+            )
+            self.seed_relations(
+                Cart, 'recipe', users, recipes, options['carts']
+            )
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(
+                    no_style(), (User, Recipe)
+                ):
+                    cursor.execute(sql)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - start:.1f} с '
+            f'({"COPY" if self.use_copy else "bulk_create"})'
+        ))
+
+    def report(self, writer):
+        self.stdout.write(
+            f'{writer.model.__name__}: {writer.written} строк'
+        )
+
+    def next_id(self, model):
+        last = model.objects.order_by('-pk').values_list('pk', flat=True)
+        return (last.first() or 0) + 1
+
+    def seed_users(self):
+        writer = Writer(
+            User, self.options['batch_size'], self.use_copy, explicit_pk=True
+        )
+        first = self.next_id(User)
+        ids = range(first, first + self.options['users'])
+        for number, pk in enumerate(ids):
+            writer.add(User(
+                pk=pk,
+                username=f'{PREFIX}{number}',
+                email=f'{PREFIX}{number}@example.com',
+                first_name='Seed',
+                last_name=str(number),
+                password='!',
+            ))
+        writer.flush()
+        self.report(writer)
+        return ids
+
+    def seed_recipes(self, users):
+        options, rnd = self.options, self.rnd
+        authors = PowerLaw(users, options['alpha'], rnd)
+        ingredients = list(Ingredient.objects.values_list('pk', flat=True))
+        tags = list(Tag.objects.values_list('pk', flat=True))
+        recipes = Writer(
+            Recipe, options['batch_size'], self.use_copy, explicit_pk=True
+        )
+        amounts = Writer(
+            RecipeIngredient, options['batch_size'], self.use_copy
+        )
+        recipe_tags = Writer(RecipeTag, options['batch_size'], self.use_copy)
+        first = self.next_id(Recipe)
+        ids = range(first, first + options['recipes'])
+        chosen_tags = []
+        for pk in ids:
+            (author,) = authors.sample(rnd, 1)
+            chosen = rnd.sample(tags, rnd.randint(1, len(tags)))
+            chosen_tags.append(chosen)
+            recipes.add(Recipe(
+                pk=pk,
+                author_id=author,
+                name=f'Рецепт {pk}',
+                text='Синтетический рецепт для нагрузочного тестирования.',
+                cooking_time=rnd.randint(5, 180),
+                image=SEED_IMAGE,
+            ))
+        recipes.flush()
+        for pk, chosen in zip(ids, chosen_tags):
+            for ingredient in rnd.sample(ingredients, rnd.randint(3, 12)):
+                amounts.add(RecipeIngredient(
+                    recipe_id=pk,
+                    ingredient_id=ingredient,
+                    amount=rnd.randint(1, 500)
+                ))
+            for tag in chosen:
+                recipe_tags.add(RecipeTag(recipe_id=pk, tag_id=tag))
+        amounts.flush()
+        recipe_tags.flush()
+        for writer in (recipes, amounts, recipe_tags):
+            self.report(writer)
+        return ids
+
+    def seed_relations(self, model, target_field, users, targets, total):
+        """Равномерно по пользователям, степенной закон по целям."""
+        rnd = self.rnd
+        if not targets or total <= 0:
+            return
+        popular = PowerLaw(targets, self.options['alpha'], rnd)
+        writer = Writer(model, self.options['batch_size'], self.use_copy)
+        mean = total / len(users)
+        for user in users:
+            count = round(mean * rnd.paretovariate(2.0) / 2)
+            for target in popular.sample(rnd, count):
+                if target_field == 'author' and target == user:
+                    continue
+                writer.add(model(
+                    user_id=user, **{f'{target_field}_id': target}
+                ))
+        writer.flush()
+        self.report(writer)
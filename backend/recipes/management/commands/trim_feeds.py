@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from recipes.feed import get_feed_max_length, overflowing_feeds, trim_feed
+
+
+class Command(BaseCommand):
+    help = 'Deletes feed entries beyond FEED_MAX_LENGTH latest per user'
+
+    def handle(self, *args, **options):
+        feeds = deleted = 0
+        for user_id in overflowing_feeds().iterator():
+            feeds += 1
+            deleted += trim_feed(user_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Лент длиннее {get_feed_max_length()} записей: {feeds}, '
+            f'удалено записей: {deleted}'
+        ))
@@ -0,0 +1,45 @@
+# Generated by Django 4.1.1 on 2026-10-18 03:44
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    MediaFile = apps.get_model('recipes', 'MediaFile')
+    references = Counter()
+    for model_name in ('Recipe', 'UploadedImage'):
+        model = apps.get_model('recipes', model_name)
+        references.update(
+            model.objects.exclude(image='').values_list('image', flat=True)
+        )
+    MediaFile.objects.bulk_create(
+        (
+            MediaFile(name=name, references=count)
+            for name, count in references.items()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0027_uploadedimage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Путь к файлу')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Количество ссылок')),
+            ],
+            options={
+                'verbose_name': 'Медиафайл',
+                'verbose_name_plural': 'Медиафайлы',
+            },
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
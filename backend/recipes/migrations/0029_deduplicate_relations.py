@@ -0,0 +1,72 @@
+# Generated by Django 4.1.1 on 2026-10-18 03:53
+
+from django.db import migrations
+from django.db.models import Count, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+RELATIONS = (
+    ('Favorite', ('user', 'recipe')),
+    ('Cart', ('user', 'recipe')),
+    ('Follow', ('user', 'author')),
+    ('RecipeIngredient', ('recipe', 'ingredient')),
+    ('RecipeTag', ('recipe', 'tag')),
+)
+
+
+def merge_amounts(RecipeIngredient):
+    duplicates = RecipeIngredient.objects.values(
+        'recipe', 'ingredient'
+    ).annotate(
+        keep=Min('pk'), total=Sum('amount'), rows=Count('pk')
+    ).filter(rows__gt=1)
+    for group in duplicates.iterator():
+        RecipeIngredient.objects.filter(pk=group['keep']).update(
+            amount=group['total']
+        )
+
+
+def deduplicate(apps, schema_editor):
+    deleted = {}
+    for model_name, fields in RELATIONS:
+        model = apps.get_model('recipes', model_name)
+        orphans = Q()
+        for field in fields:
+            orphans |= Q(**{f'{field}__isnull': True})
+        removed, _ = model.objects.filter(orphans).delete()
+        if model_name == 'RecipeIngredient':
+            merge_amounts(model)
+        keep = model.objects.values(*fields).annotate(
+            keep=Min('pk')
+        ).values('keep')
+        duplicates, _ = model.objects.exclude(pk__in=Subquery(keep)).delete()
+        deleted[model_name] = removed + duplicates
+    if deleted['Favorite'] or deleted['Cart']:
+        recount(apps)
+
+
+def recount(apps):
+    Recipe = apps.get_model('recipes', 'Recipe')
+
+    def count_of(model_name):
+        model = apps.get_model('recipes', model_name)
+        return Coalesce(Subquery(
+            model.objects.filter(recipe=OuterRef('pk')).values(
+                'recipe'
+            ).annotate(count=Count('pk')).values('count')
+        ), 0)
+
+    Recipe.objects.update(
+        favorites_count=count_of('Favorite'),
+        in_carts_count=count_of('Cart')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0028_mediafile'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.1.1 on 2026-10-18 03:55
+
+from django.db import migrations, models
+
+# Колонка вычисляется самой базой при каждой записи рецепта, поэтому она
+# не описана в модели и существует только на PostgreSQL 12+. На остальных
+# базах поиск работает через recipes.search.RecipeIndex.
+ADD_SEARCH_VECTOR = """
+ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian'::regconfig, coalesce(name, '')), 'A')
+        || setweight(to_tsvector('russian'::regconfig, coalesce(text, '')), 'B')
+    ) STORED;
+CREATE INDEX recipe_search_vector_idx ON recipes_recipe
+    USING gin (search_vector);
+"""
+DROP_SEARCH_VECTOR = """
+DROP INDEX IF EXISTS recipe_search_vector_idx;
+ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector;
+"""
+
+
+def add_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(ADD_SEARCH_VECTOR)
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_VECTOR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0030_relation_constraints'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(add_search_vector, drop_search_vector),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.1.1 on 2026-10-18 05:12
+
+import django.core.validators
+from django.db import migrations, models
+
+TAG_BITS = 63
+BATCH_SIZE = 1000
+
+
+def fill_tags_masks(apps, schema_editor):
+    Tag = apps.get_model('recipes', 'Tag')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeTag = apps.get_model('recipes', 'RecipeTag')
+    tags = list(Tag.objects.order_by('pk'))
+    if len(tags) > TAG_BITS:
+        raise RuntimeError(
+            f'Тегов {len(tags)}, в маске помещается не больше {TAG_BITS}.'
+        )
+    for bit, tag in enumerate(tags):
+        tag.bit = bit
+    Tag.objects.bulk_update(tags, ('bit',))
+    masks = {}
+    for recipe_id, bit in RecipeTag.objects.values_list(
+        'recipe_id', 'tag__bit'
+    ).iterator():
+        masks[recipe_id] = masks.get(recipe_id, 0) | 1 << bit
+    Recipe.objects.bulk_update(
+        (Recipe(pk=pk, tags_mask=mask) for pk, mask in masks.items()),
+        ('tags_mask',),
+        batch_size=BATCH_SIZE
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0031_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, verbose_name='Бит в маске тегов'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.RunPython(fill_tags_masks, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, unique=True, validators=[django.core.validators.MaxValueValidator(62)], verbose_name='Бит в маске тегов'),
+        ),
+    ]
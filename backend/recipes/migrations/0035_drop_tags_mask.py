@@ -0,0 +1,21 @@
+# Generated by Django 4.1.1 on 2026-10-18 05:06
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0034_feed_entry_recipe_index'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='recipe',
+            name='tags_mask',
+        ),
+        migrations.RemoveField(
+            model_name='tag',
+            name='bit',
+        ),
+    ]
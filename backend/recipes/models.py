@@ -1,6 +1,7 @@
 from django.core import validators
 from django.db import models
-from users.models import User
+from django.utils import timezone
+from users.models import CountersMixin, User
 
 
 class Tag(models.Model):
@@ -57,7 +58,16 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+
+    def touch(self):
+        """Отмечает рецепты изменёнными одним UPDATE, для ETag и индексов."""
+        return self.update(updated_at=timezone.now())
+
+
+class Recipe(CountersMixin, models.Model):
+    counter_fields = ('favorites_count', 'in_carts_count')
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -97,6 +107,24 @@ class Recipe(models.Model):
         auto_now_add=True,
         db_index=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+        db_index=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        db_index=True,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
@@ -113,17 +141,14 @@ class RecipeIngredient(models.Model):
         related_name='ingredients_lst',
         on_delete=models.CASCADE,
         verbose_name='Рецепт',
-        blank=True,
-        null=True
+        db_index=False
     )
     ingredient = models.ForeignKey(
         Ingredient,
         related_name='recipes',
         on_delete=models.CASCADE,
         verbose_name='Ингредиент',
-        help_text='Выберите ингредиент',
-        blank=True,
-        null=True
+        help_text='Выберите ингредиент'
     )
     amount = models.IntegerField(
         verbose_name='Количество',
@@ -133,6 +158,14 @@ class RecipeIngredient(models.Model):
         blank=True
     )
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'ingredient'),
+                name='unique_recipe_ingredient'
+            ),
+        )
+
     def __str__(self):
         return f"'ingredient': {self.ingredient.name}, 'amount': {self.amount}"
 
@@ -143,18 +176,30 @@ class RecipeTag(models.Model):
         related_name='tags_lst',
         on_delete=models.CASCADE,
         verbose_name='Рецепт',
-        blank=True,
-        null=True
+        db_index=False
     )
     tag = models.ForeignKey(
         Tag,
         on_delete=models.CASCADE,
         verbose_name='Тег',
         help_text='Выберите тег',
-        blank=True,
-        null=True
+        db_index=False
     )
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'tag'),
+                name='unique_recipe_tag'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('tag', 'recipe'),
+                name='recipetag_tag_recipe_idx'
+            ),
+        )
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -162,18 +207,23 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Подписчик',
         related_name='following',
-        blank=True,
-        null=True
+        db_index=False
     )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         verbose_name='Автор',
-        related_name='follower',
-        blank=True,
-        null=True
+        related_name='follower'
     )
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow'
+            ),
+        )
+
 
 class Favorite(models.Model):
     user = models.ForeignKey(
@@ -181,18 +231,23 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Подписчик',
         related_name='favorite_recipes',
-        blank=True,
-        null=True
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         verbose_name='Автор',
-        related_name='follower',
-        blank=True,
-        null=True
+        related_name='follower'
     )
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_favorite'
+            ),
+        )
+
 
 class Cart(models.Model):
     user = models.ForeignKey(
@@ -200,14 +255,108 @@ class Cart(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Владелец списка',
         related_name='cart',
-        blank=True,
-        null=True
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
         verbose_name='Рецепт',
         on_delete=models.CASCADE,
-        related_name='cart',
-        blank=True,
-        null=True
+        related_name='cart'
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_cart'
+            ),
+        )
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик',
+        related_name='feed'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='feed_entries'
     )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_user_pub_date_recipe_idx'
+            ),
+        )
+
+
+class UploadedImage(models.Model):
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Владелец',
+        related_name='uploaded_images'
+    )
+    image = models.ImageField(
+        verbose_name='Изображение',
+        upload_to='recipes/images/'
+    )
+    created = models.DateTimeField(
+        verbose_name='Дата загрузки',
+        auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = 'Загруженное изображение'
+        verbose_name_plural = 'Загруженные изображения'
+
+
+class MediaFile(models.Model):
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Путь к файлу'
+    )
+    references = models.PositiveIntegerField(
+        verbose_name='Количество ссылок',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+
+    def __str__(self):
+        return self.name
+
+
+class CatalogVersion(models.Model):
+    """Версия справочников тегов и ингредиентов, одна строка.
+
+    Хранится в базе, чтобы её изменение сразу видели все процессы и
+    чтобы она менялась в той же транзакции, что и сами справочники.
+    """
+    version = models.BigIntegerField(
+        verbose_name='Версия',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Версия справочников'
+        verbose_name_plural = 'Версия справочников'
@@ -0,0 +1,256 @@
+"""Поиск рецептов по набору ингредиентов («что приготовить из того, что есть»).
+
+Для каждого ингредиента хранится список рецептов, в которых он
+используется. Редкие ингредиенты хранят отсортированный array('I') с id
+рецептов, частые — битовую карту в целом числе Python (бит N — рецепт
+с id N). Так список занимает не больше четырёх байт на рецепт, а
+пересечение, объединение и подсчёт совпадений выполняются побитовыми
+операциями над целыми числами, то есть сразу над машинными словами.
+"""
+import re
+from array import array
+from bisect import bisect_left, insort
+from functools import reduce
+from operator import and_, or_
+from threading import Lock
+
+from django.utils import timezone
+from recipes.models import Recipe, RecipeIngredient
+from recipes.search import REFRESH_OVERLAP, rank_recipes
+
+MATCH_MODES = ('all', 'any', 'most')
+MAX_QUERY_INGREDIENTS = 30
+# Битовая карта выгоднее массива, когда рецептом с ингредиентом является
+# хотя бы каждый 32-й рецепт: массив тратит 32 бита на элемент.
+DENSE_RATIO = 32
+REFRESH_CHUNK = 500
+# Плоский массив составов сжимается, когда в нём вдвое больше элементов,
+# чем в текущих составах.
+COMPACT_RATIO = 2
+NONZERO_BYTE = re.compile(rb'[^\x00]')
+
+
+def to_bitmap(ids):
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for pk in ids:
+        buffer[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def bitmap_ids(bitmap):
+    """id из битовой карты в порядке убывания."""
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    for match in reversed(list(NONZERO_BYTE.finditer(data))):
+        position = match.start()
+        byte = data[position]
+        for bit in range(7, -1, -1):
+            if byte >> bit & 1:
+                yield position * 8 + bit
+
+
+def count_planes(bitmaps):
+    """Побитовые счётчики: бит рецепта в planes[i] — i-й бит числа
+    списков, в которых он встречается (параллельный сумматор)."""
+    planes = []
+    for bitmap in bitmaps:
+        carry = bitmap
+        for level, plane in enumerate(planes):
+            planes[level], carry = plane ^ carry, plane & carry
+            if not carry:
+                break
+        else:
+            if carry:
+                planes.append(carry)
+    return planes
+
+
+def with_count(planes, count, universe):
+    """Битовая карта рецептов, встретившихся ровно в count списках."""
+    if count >> len(planes):
+        return 0
+    mask = universe
+    for level, plane in enumerate(planes):
+        mask &= plane if count >> level & 1 else universe ^ plane
+    return mask
+
+
+class IngredientRecipeIndex:
+    """Индекс ингредиент → рецепты в памяти процесса.
+
+    Строится лениво одним проходом по RecipeIngredient. Состав каждого
+    рецепта хранится в плоском массиве (offsets/lengths по id рецепта),
+    чтобы при изменении рецепта обновлять только затронутые списки.
+    Новый состав дописывается в конец массива, а накопившиеся старые
+    составы периодически вырезаются.
+    RecipeSerializer сообщает индексу о новых составах после коммита,
+    изменения из других процессов догружаются перед запросом по
+    updated_at, как в RecipeIndex.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._postings = None
+        self._offsets = None
+        self._lengths = None
+        self._flat = None
+        self._live = 0
+        self._refreshed_at = None
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+            self._offsets = None
+            self._lengths = None
+            self._flat = None
+            self._live = 0
+            self._refreshed_at = None
+
+    def update(self, recipe_id, ingredient_ids):
+        with self._lock:
+            if self._postings is not None:
+                self._set(recipe_id, ingredient_ids)
+
+    def remove(self, recipe_id):
+        self.update(recipe_id, ())
+
+    def _ingredients_of(self, recipe_id):
+        if recipe_id >= len(self._lengths):
+            return ()
+        start = self._offsets[recipe_id]
+        return self._flat[start:start + self._lengths[recipe_id]]
+
+    def _set(self, recipe_id, ingredient_ids):
+        old = set(self._ingredients_of(recipe_id))
+        new = set(ingredient_ids)
+        if old == new:
+            return
+        for ingredient_id in old - new:
+            postings = self._postings[ingredient_id]
+            if isinstance(postings, int):
+                self._postings[ingredient_id] = postings & ~(1 << recipe_id)
+            else:
+                position = bisect_left(postings, recipe_id)
+                if position < len(postings) and (
+                    postings[position] == recipe_id
+                ):
+                    del postings[position]
+        for ingredient_id in new - old:
+            postings = self._postings.setdefault(ingredient_id, array('I'))
+            if isinstance(postings, int):
+                self._postings[ingredient_id] = postings | 1 << recipe_id
+            else:
+                insort(postings, recipe_id)
+        missing = recipe_id + 1 - len(self._lengths)
+        if missing > 0:
+            self._offsets.extend(bytes(missing * self._offsets.itemsize))
+            self._lengths.extend(bytes(missing * self._lengths.itemsize))
+        self._offsets[recipe_id] = len(self._flat)
+        self._lengths[recipe_id] = len(new)
+        self._flat.extend(sorted(new))
+        self._live += len(new) - len(old)
+        if len(self._flat) > COMPACT_RATIO * self._live:
+            self._compact()
+
+    def _compact(self):
+        flat = array('I')
+        for recipe_id, length in enumerate(self._lengths):
+            start = self._offsets[recipe_id]
+            self._offsets[recipe_id] = len(flat)
+            flat.extend(self._flat[start:start + length])
+        self._flat = flat
+
+    def _build(self):
+        self._refreshed_at = timezone.now()
+        postings, flat = {}, array('I')
+        offsets, lengths = array('I'), array('H')
+        rows = RecipeIngredient.objects.order_by(
+            'recipe_id', 'ingredient_id'
+        ).values_list('recipe_id', 'ingredient_id')
+        for recipe_id, ingredient_id in rows.iterator(chunk_size=10000):
+            if recipe_id >= len(lengths):
+                missing = recipe_id + 1 - len(lengths)
+                offsets.extend(bytes(missing * offsets.itemsize))
+                lengths.extend(bytes(missing * lengths.itemsize))
+            if not lengths[recipe_id]:
+                offsets[recipe_id] = len(flat)
+            flat.append(ingredient_id)
+            lengths[recipe_id] += 1
+            postings.setdefault(ingredient_id, array('I')).append(recipe_id)
+        universe = len(lengths)
+        for ingredient_id, recipes in postings.items():
+            if len(recipes) * DENSE_RATIO >= universe:
+                postings[ingredient_id] = to_bitmap(recipes)
+        self._postings = postings
+        self._offsets, self._lengths, self._flat = offsets, lengths, flat
+        self._live = len(flat)
+
+    def _refresh(self):
+        if self._postings is None:
+            self._build()
+            return
+        changed = list(Recipe.objects.filter(
+            updated_at__gte=self._refreshed_at - REFRESH_OVERLAP
+        ).order_by().values_list('pk', flat=True))
+        self._refreshed_at = timezone.now()
+        for start in range(0, len(changed), REFRESH_CHUNK):
+            chunk = changed[start:start + REFRESH_CHUNK]
+            compositions = {pk: [] for pk in chunk}
+            for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+                recipe_id__in=compositions
+            ).values_list('recipe_id', 'ingredient_id'):
+                compositions[recipe_id].append(ingredient_id)
+            for recipe_id, ingredient_ids in compositions.items():
+                self._set(recipe_id, ingredient_ids)
+
+    def _bitmap(self, ingredient_id):
+        postings = self._postings.get(ingredient_id)
+        if isinstance(postings, int):
+            return postings
+        return to_bitmap(postings)
+
+    def search(self, ingredient_ids, match='all', limit=None):
+        """Список (id рецепта, число совпавших ингредиентов).
+
+        Рецепты упорядочены по числу совпадений, затем по доле совпавших
+        ингредиентов в рецепте (меньше докупать), затем от новых к старым.
+        limit оставляет только первые рецепты.
+        """
+        ingredient_ids = sorted(set(ingredient_ids))
+        total = len(ingredient_ids)
+        if not total:
+            return []
+        need = {'all': total, 'any': 1, 'most': total // 2 + 1}[match]
+        result = []
+        with self._lock:
+            self._refresh()
+            bitmaps = [self._bitmap(pk) for pk in ingredient_ids]
+            if match == 'all':
+                levels = ((total, reduce(and_, bitmaps)),)
+            else:
+                planes = count_planes(bitmaps)
+                universe = reduce(or_, bitmaps)
+                levels = (
+                    (count, with_count(planes, count, universe))
+                    for count in range(total, need - 1, -1)
+                )
+            for count, bitmap in levels:
+                if not bitmap:
+                    continue
+                candidates = sorted(
+                    bitmap_ids(bitmap), key=self._lengths.__getitem__
+                )
+                result.extend((pk, count) for pk in candidates)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result[:limit]
+
+
+ingredient_recipe_index = IngredientRecipeIndex()
+
+
+def match_ingredients(recipes, ingredient_ids, match='all'):
+    """Рецепты, содержащие ингредиенты, по убыванию покрытия набора."""
+    ranked = ingredient_recipe_index.search(ingredient_ids, match)
+    return rank_recipes(recipes, [pk for pk, _ in ranked])
@@ -0,0 +1,361 @@
+import heapq
+import re
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from datetime import timedelta
+from math import log
+from operator import itemgetter
+from threading import Lock
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from recipes.cache import get_catalog_version
+from recipes.models import Ingredient, Recipe
+
+PREFIX_CACHE_SIZE = 256
+FUZZY_LIMIT = 20
+SIMILARITY_THRESHOLD = 0.3
+
+SEARCH_CONFIG = 'russian'
+NAME_WEIGHT = 1.0
+TEXT_WEIGHT = 0.4
+MIN_PREFIX_LENGTH = 3
+RANKED_CHUNK = 500
+RANKED_FILTERED_LIMIT = 10000
+RANKED_MAX_RESULTS = 1000
+# Транзакция может закоммитить рецепт с updated_at раньше момента прошлой
+# догрузки, поэтому при догрузке перечитывается и этот запас времени.
+REFRESH_OVERLAP = timedelta(seconds=30)
+WORD = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Приводит строку к виду для сравнения: регистр, ё/е, пробелы."""
+    return ' '.join(text.casefold().replace('ё', 'е').split())
+
+
+def tokenize(text):
+    return WORD.findall(normalize(text))
+
+
+def trigrams(text):
+    """Множество триграмм строки по правилам pg_trgm."""
+    result = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        result.update(
+            padded[i:i + 3] for i in range(len(padded) - 2)
+        )
+    return result
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса.
+
+    Нормализованные названия хранятся в отсортированном массиве, поиск
+    префикса выполняется двумя бинарными поисками, а результаты для частых
+    префиксов кешируются в ограниченном LRU. Для поиска с опечатками
+    используется инвертированный индекс триграмм: кандидаты ранжируются
+    по сходству Жаккара, как similarity() в pg_trgm. Индекс строится лениво
+    одним запросом к основной базе и перестраивается, когда меняется версия
+    справочников (recipes.cache): её видят все процессы, в том числе
+    после массовой загрузки без сигналов. Версия запоминается в процессе
+    на CATALOG_VERSION_TTL секунд, поэтому тёплый поиск в базу не ходит.
+    """
+
+    def __init__(self, cache_size=PREFIX_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._lock = Lock()
+        self._version = None
+        self._keys = None
+        self._ingredients = None
+        self._trigrams = None
+        self._postings = None
+        self._cache = OrderedDict()
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+            self._keys = None
+            self._ingredients = None
+            self._trigrams = None
+            self._postings = None
+            self._cache.clear()
+
+    def _build(self):
+        rows = sorted(
+            Ingredient.objects.using(DEFAULT_DB_ALIAS).values_list(
+                'id', 'name', 'measurement_unit'
+            ),
+            key=lambda row: normalize(row[1])
+        )
+        self._keys = [normalize(name) for _, name, _ in rows]
+        self._ingredients = [
+            Ingredient(id=pk, name=name, measurement_unit=measurement_unit)
+            for pk, name, measurement_unit in rows
+        ]
+        self._trigrams = []
+        self._postings = {}
+        for position, key in enumerate(self._keys):
+            key_trigrams = trigrams(key)
+            self._trigrams.append(len(key_trigrams))
+            for trigram in key_trigrams:
+                self._postings.setdefault(trigram, []).append(position)
+
+    def _ensure_built(self):
+        version = get_catalog_version()
+        if self._keys is None or version != self._version:
+            self._build()
+            self._cache.clear()
+            self._version = version
+
+    def search(self, prefix):
+        prefix = normalize(prefix)
+        with self._lock:
+            self._ensure_built()
+            result = self._cache.get(prefix)
+            if result is not None:
+                self._cache.move_to_end(prefix)
+                return result
+            start = bisect_left(self._keys, prefix)
+            end = bisect_left(self._keys, prefix + '\U0010ffff', start)
+            result = tuple(self._ingredients[start:end])
+            self._cache[prefix] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def fuzzy_search(self, query, limit=FUZZY_LIMIT,
+                     threshold=SIMILARITY_THRESHOLD):
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            return ()
+        with self._lock:
+            self._ensure_built()
+            shared = Counter()
+            for trigram in query_trigrams:
+                shared.update(self._postings.get(trigram, ()))
+            ranked = []
+            for position, common in shared.items():
+                similarity = common / (
+                    len(query_trigrams) + self._trigrams[position] - common
+                )
+                if similarity >= threshold:
+                    ranked.append((-similarity, position))
+            ranked.sort()
+            return tuple(
+                self._ingredients[position] for _, position in ranked[:limit]
+            )
+
+
+ingredient_index = IngredientIndex()
+
+
+class RecipeIndex:
+    """Инвертированный индекс рецептов для баз без полнотекстового поиска.
+
+    Используется вместо tsvector, когда база не PostgreSQL. Для каждого
+    слова хранится вес в рецепте: вхождения в название весят как класс A
+    в ts_rank, в описание — как класс B. Слова запроса объединяются по И,
+    последнее слово ищется и как префикс. Перед поиском индекс догружает
+    рецепты, изменённые после предыдущей догрузки, одним запросом по
+    updated_at, поэтому изменения из других процессов тоже попадают в
+    выдачу, а удалённые рецепты отсекает итоговый запрос к базе.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._postings = None
+        self._documents = None
+        self._terms = None
+        self._refreshed_at = None
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+            self._documents = None
+            self._terms = None
+            self._refreshed_at = None
+
+    def remove(self, pk):
+        with self._lock:
+            if self._documents is not None:
+                self._remove(pk)
+
+    def _remove(self, pk):
+        for term in self._documents.pop(pk, ()):
+            self._postings[term].pop(pk, None)
+
+    def _add(self, pk, name, text):
+        self._remove(pk)
+        weights = Counter()
+        for term in tokenize(name):
+            weights[term] += NAME_WEIGHT
+        for term in tokenize(text):
+            weights[term] += TEXT_WEIGHT
+        for term, weight in weights.items():
+            self._postings.setdefault(term, {})[pk] = weight
+        self._documents[pk] = tuple(weights)
+
+    def _refresh(self):
+        recipes = Recipe.objects.order_by()
+        if self._documents is None:
+            self._postings, self._documents = {}, {}
+        else:
+            recipes = recipes.filter(
+                updated_at__gte=self._refreshed_at - REFRESH_OVERLAP
+            )
+        self._refreshed_at = timezone.now()
+        known_terms = len(self._postings)
+        for pk, name, text in recipes.values_list(
+            'pk', 'name', 'text'
+        ).iterator():
+            self._add(pk, name, text)
+        if self._terms is None or len(self._postings) != known_terms:
+            self._terms = sorted(self._postings)
+
+    def _match(self, term, prefix):
+        if not prefix or len(term) < MIN_PREFIX_LENGTH:
+            return self._postings.get(term, {})
+        matched = {}
+        start = bisect_left(self._terms, term)
+        end = bisect_left(self._terms, term + '\U0010ffff', start)
+        for candidate in self._terms[start:end]:
+            for pk, weight in self._postings[candidate].items():
+                if weight > matched.get(pk, 0):
+                    matched[pk] = weight
+        return matched
+
+    def search(self, query, limit=None):
+        """Список (id, ранг) найденных рецептов по убыванию ранга.
+
+        limit оставляет только лучшие рецепты.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            self._refresh()
+            total = len(self._documents)
+            scores = None
+            for position, term in enumerate(terms):
+                matched = self._match(term, position == len(terms) - 1)
+                idf = log(1 + total / (1 + len(matched)))
+                if scores is None:
+                    scores = {
+                        pk: weight * idf for pk, weight in matched.items()
+                    }
+                else:
+                    scores = {
+                        pk: score + matched[pk] * idf
+                        for pk, score in scores.items() if pk in matched
+                    }
+                if not scores:
+                    return []
+        key = itemgetter(1, 0)
+        if limit is None:
+            return sorted(scores.items(), key=key, reverse=True)
+        return heapq.nlargest(limit, scores.items(), key=key)
+
+
+recipe_index = RecipeIndex()
+
+
+class RankedRecipes:
+    """Рецепты в порядке ранга из индекса в памяти — последовательность
+    для пагинаторов, как Feed.
+
+    Отранжированный список id остаётся в памяти, а в SQL уходят только
+    id текущей страницы. Остальные фильтры queryset проверяются отдельно:
+    если им подходит не больше RANKED_FILTERED_LIMIT рецептов, их id
+    читаются одним запросом, иначе список проверяется порциями по
+    RANKED_CHUNK id и выдача ограничивается первыми RANKED_MAX_RESULTS
+    подходящими рецептами.
+    """
+    model = Recipe
+
+    def __init__(self, queryset, ids):
+        self.queryset = queryset
+        self.ids = ids
+        self._allowed = None
+
+    def allowed(self):
+        """id рецептов, подходящих под фильтры queryset, в порядке ранга."""
+        if self._allowed is None:
+            self._allowed = self._filter()
+        return self._allowed
+
+    def _filter(self):
+        queryset = self.queryset.order_by().prefetch_related(None)
+        if not queryset.query.has_filters():
+            return self.ids
+        passed = list(queryset.values_list('pk', flat=True)[
+            :RANKED_FILTERED_LIMIT + 1
+        ])
+        if len(passed) <= RANKED_FILTERED_LIMIT:
+            passed = set(passed)
+            return [pk for pk in self.ids if pk in passed]
+        allowed = []
+        for start in range(0, len(self.ids), RANKED_CHUNK):
+            chunk = self.ids[start:start + RANKED_CHUNK]
+            passed = set(
+                queryset.filter(pk__in=chunk).values_list('pk', flat=True)
+            )
+            allowed.extend(pk for pk in chunk if pk in passed)
+            if len(allowed) >= RANKED_MAX_RESULTS:
+                return allowed[:RANKED_MAX_RESULTS]
+        return allowed
+
+    def count(self):
+        return len(self.allowed())
+
+    def get(self, *args, **kwargs):
+        recipe = self.queryset.get(*args, **kwargs)
+        if recipe.pk not in self.allowed():
+            raise Recipe.DoesNotExist('Рецепт не подходит под запрос.')
+        return recipe
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        ids = self.allowed()[key]
+        recipes = self.queryset.in_bulk(ids)
+        return [recipes[pk] for pk in ids if pk in recipes]
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+def rank_recipes(queryset, ids):
+    """Рецепты queryset в порядке ids."""
+    if not ids:
+        return queryset.none()
+    return RankedRecipes(queryset, ids)
+
+
+def search_recipes(queryset, query):
+    """Отбирает рецепты по запросу и сортирует их по релевантности.
+
+    На PostgreSQL используется колонка search_vector с GIN-индексом,
+    на остальных базах — индекс рецептов в памяти процесса: тогда
+    возвращается RankedRecipes, а не queryset.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        column = '{}.search_vector'.format(
+            connection.ops.quote_name(Recipe._meta.db_table)
+        )
+        tsquery = 'websearch_to_tsquery(%s::regconfig, %s)'
+        params = (SEARCH_CONFIG, query)
+        queryset = queryset.filter(RawSQL(
+            f'{column} @@ {tsquery}', params, output_field=BooleanField()
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank({column}, {tsquery})', params,
+            output_field=FloatField()
+        ))
+        return queryset.order_by('-search_rank', '-pub_date', '-pk')
+    return rank_recipes(
+        queryset, [pk for pk, _ in recipe_index.search(query)]
+    )
@@ -0,0 +1,166 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from recipes.cache import bump_catalog_version
+from recipes.feed import (add_author_to_feed, fan_out_recipe,
+                          remove_author_from_feed)
+from recipes.images import schedule_derivatives
+from recipes.models import (Cart, Favorite, Follow, Ingredient, Recipe,
+                            Tag, UploadedImage)
+from recipes.postings import ingredient_recipe_index
+from recipes.search import recipe_index
+from recipes.storage import acquire, release
+from users.models import User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_catalog_cache(**kwargs):
+    bump_catalog_version()
+
+
+@receiver(pre_delete, sender=Ingredient)
+def touch_recipes_with_ingredient(instance, **kwargs):
+    Recipe.objects.filter(ingredients_lst__ingredient=instance).touch()
+
+
+@receiver(pre_delete, sender=Tag)
+def touch_recipes_with_tag(instance, **kwargs):
+    Recipe.objects.filter(tags=instance).touch()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_recipes_with_changed_tags(instance, action, reverse, pk_set,
+                                    **kwargs):
+    if reverse and action == 'pre_clear':
+        instance._cleared_recipes = list(
+            instance.recipe_set.values_list('pk', flat=True)
+        )
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            recipe_ids = (instance.pk,)
+        elif action == 'post_clear':
+            recipe_ids = instance._cleared_recipes
+        else:
+            recipe_ids = pk_set
+        Recipe.objects.filter(pk__in=recipe_ids).touch()
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_search_index(instance, **kwargs):
+    recipe_index.remove(instance.pk)
+    ingredient_recipe_index.remove(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def build_image_derivatives(instance, **kwargs):
+    # Счётчики и updated_at сохраняются без смены картинки, им производные
+    # не нужны; прежнее имя файла запомнил remember_image.
+    image_name = instance.image.name
+    if image_name == instance._stored_image:
+        return
+    transaction.on_commit(lambda: schedule_derivatives(image_name))
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_new_recipe(instance, created, **kwargs):
+    if created:
+        fan_out_recipe(instance)
+
+
+@receiver(post_save, sender=Follow)
+def add_followed_author(instance, created, **kwargs):
+    if created and instance.user_id and instance.author_id:
+        add_author_to_feed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_followed_author(instance, **kwargs):
+    if instance.user_id and instance.author_id:
+        remove_author_from_feed(instance.user_id, instance.author_id)
+
+
+def change_counter(model, pk, field, delta):
+    if pk:
+        model.objects.filter(pk=pk).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def increment_followers_count(instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_followers_count(instance, **kwargs):
+    change_counter(User, instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Cart)
+def increment_in_carts_count(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'in_carts_count', 1)
+
+
+@receiver(post_delete, sender=Cart)
+def decrement_in_carts_count(instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'in_carts_count', -1)
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=UploadedImage)
+def remember_image(instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        instance._image_written = False
+        instance._stored_image = instance.image.name
+        return
+    # Новый файл пишет хранилище, и оно же берёт на него ссылку.
+    instance._image_written = not instance.image._committed
+    instance._stored_image = ''
+    if not instance._state.adding:
+        instance._stored_image = type(instance).objects.filter(
+            pk=instance.pk
+        ).values_list('image', flat=True).first() or ''
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=UploadedImage)
+def count_image_references(instance, **kwargs):
+    image, stored = instance.image.name, instance._stored_image
+    if not instance._image_written and image != stored:
+        acquire(image)
+    if instance._image_written or image != stored:
+        release(stored)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=UploadedImage)
+def release_image(instance, **kwargs):
+    release(instance.image.name)
@@ -0,0 +1,77 @@
+"""Хранилище медиафайлов с адресацией по содержимому.
+
+Файл сохраняется под именем sha256 своего содержимого, поэтому повторная
+загрузка той же картинки не создаёт копию. Ссылки на файлы из Recipe и
+UploadedImage считаются в MediaFile; файл и его производные удаляются,
+когда ссылок не остаётся.
+
+Сохранение сначала берёт ссылку, а потом проверяет, есть ли файл, а
+удаление блокирует строку MediaFile без ссылок и удаляет файлы под этой
+блокировкой. Поэтому параллельное удаление либо ждёт новую ссылку и
+ничего не трогает, либо успевает раньше, и тогда файл пишется заново.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
+from django.db.models import F
+from recipes.images import derivative_names, forget
+from recipes.models import MediaFile
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest.hexdigest() + extension)
+        # ссылка сохраняемой модели, её учитывает count_image_references
+        acquire(name)
+        if self.exists(name):
+            return name
+        saved = super()._save(name, content)
+        if saved != name:
+            # тот же файл параллельно записал другой процесс
+            self.delete(saved)
+        return name
+
+
+def acquire(name):
+    if not name:
+        return
+    # Строку могут удалить между вставкой и UPDATE, тогда вставляем снова.
+    updated = 0
+    while not updated:
+        MediaFile.objects.bulk_create(
+            (MediaFile(name=name),), ignore_conflicts=True
+        )
+        updated = MediaFile.objects.filter(name=name).update(
+            references=F('references') + 1
+        )
+
+
+def release(name):
+    if not name:
+        return
+    MediaFile.objects.filter(name=name, references__gt=0).update(
+        references=F('references') - 1
+    )
+    transaction.on_commit(lambda: delete_if_unreferenced(name))
+
+
+def delete_if_unreferenced(name):
+    with transaction.atomic():
+        media = MediaFile.objects.select_for_update().filter(
+            name=name, references=0
+        ).first()
+        if media is None:
+            return
+        default_storage.delete(name)
+        for formats in derivative_names(name).values():
+            for path in formats.values():
+                default_storage.delete(path)
+        media.delete()
+    forget(name)
@@ -0,0 +1,60 @@
+"""Фильтр рецептов по тегам через индекс (tag, recipe) таблицы RecipeTag.
+
+Slug тегов переводятся в id по словарю в памяти процесса, а отбор рецептов
+хотя бы с одним из тегов — одно условие id IN (SELECT recipe_id FROM
+RecipeTag WHERE tag_id IN ...). Подзапрос читается по индексу
+recipetag_tag_recipe_idx, внешний запрос не соединяется с RecipeTag,
+поэтому рецепт с несколькими тегами попадает в выборку один раз без
+DISTINCT.
+"""
+from threading import Lock
+
+from django.db import DEFAULT_DB_ALIAS
+from recipes.cache import get_catalog_version
+from recipes.models import RecipeTag, Tag
+
+
+class TagIds:
+    """Соответствие slug тегов их id в памяти процесса.
+
+    Перечитывается одним запросом к основной базе, когда меняется версия
+    справочников (recipes.cache), то есть после сохранения или удаления
+    тега.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._by_slug = {}
+
+    def _refresh(self):
+        version = get_catalog_version()
+        if version == self._version:
+            return
+        self._by_slug = dict(
+            Tag.objects.using(DEFAULT_DB_ALIAS).values_list('slug', 'pk')
+        )
+        self._version = version
+
+    def ids(self, slugs):
+        """id тегов по slug и список неизвестных slug."""
+        ids, unknown = [], []
+        with self._lock:
+            self._refresh()
+            for slug in slugs:
+                pk = self._by_slug.get(slug)
+                if pk is None:
+                    unknown.append(slug)
+                else:
+                    ids.append(pk)
+        return ids, unknown
+
+
+tag_ids = TagIds()
+
+
+def filter_by_tags(queryset, ids):
+    """Рецепты хотя бы с одним тегом из ids."""
+    return queryset.filter(pk__in=RecipeTag.objects.filter(
+        tag_id__in=ids
+    ).values('recipe_id'))
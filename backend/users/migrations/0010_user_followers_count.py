@@ -0,0 +1,35 @@
+# Generated by Django 4.1.1 on 2026-10-18 09:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_followers_count(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Follow = apps.get_model('recipes', 'Follow')
+    User.objects.update(followers_count=Coalesce(
+        Subquery(
+            Follow.objects.filter(
+                author=OuterRef('pk')
+            ).values('author').annotate(count=Count('pk')).values('count')
+        ),
+        0
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_user_recipes_count'),
+        ('recipes', '0030_relation_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество подписчиков'),
+        ),
+        migrations.RunPython(fill_followers_count, migrations.RunPython.noop),
+    ]
@@ -3,7 +3,26 @@ from django.core import validators
 from django.db import models
 
 
-class User(AbstractUser):
+class CountersMixin:
+    """Не перезаписывает денормализованные счётчики при save().
+
+    Счётчики меняют сигналы атомарными UPDATE с F(), поэтому save() уже
+    загруженного объекта сохраняет все поля, кроме counter_fields, и не
+    затирает чужие изменения старыми значениями из памяти.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            skipped = {*self.counter_fields, *self.get_deferred_fields()}
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     ADMIN = 'admin'
     USER = 'user'
     ROLES = (
@@ -11,6 +30,7 @@ class User(AbstractUser):
         (USER, 'user'),
     )
     USERNAME_FIELD = 'email'
+    counter_fields = ('recipes_count', 'followers_count')
     REQUIRED_FIELDS = (
         'username',
         'first_name',
@@ -48,6 +68,16 @@ class User(AbstractUser):
         max_length=150
     )
     is_subscribed = models.BooleanField(default=False)
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         ordering = ('username',)